@@ -2,13 +2,48 @@
 
 from flask import Flask
 from config import Config
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from app.cache import cache, fragments
+from app import compression, instrumentation
+from app.sqlite import TunedSQLAlchemy
+from app.writer import writer
 
-app = Flask(__name__)
-app.config.from_object(Config)
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+db = TunedSQLAlchemy()
 
-from app import routes, models, forms
 
+class DeferredMigrate:
+    """holds the place of Flask-Migrate in app.extensions until a `flask db` command first reads it,
+    so only the migration commands import Flask-Migrate and alembic"""
+
+    def __init__(self, app, db):
+        self._app = app
+        self._db = db
+
+    def __getattr__(self, name):
+        from flask_migrate import Migrate
+        Migrate(self._app, self._db)
+        return getattr(self._app.extensions['migrate'], name)
+
+
+def create_app(config=Config) -> Flask:
+    """builds the application with its extensions, blueprints and CLI commands"""
+    app = Flask(__name__)
+    app.config.from_object(config)
+    db.init_app(app)
+    app.extensions['migrate'] = DeferredMigrate(app, db)
+    cache.init_app(app)
+    fragments.init_app(app)
+    instrumentation.init_app(app)
+    compression.init_app(app)
+    writer.init_app(app)
+
+    from app import models, search
+    from app import cli
+    from app.autocomplete import autocomplete
+    autocomplete.init_app(app)
+    from app.maintenance import scheduler
+    scheduler.init_app(app)
+    from app.routes import library_bp, api_bp
+    app.register_blueprint(library_bp)
+    app.register_blueprint(api_bp)
+    cli.init_app(app)
+    return app
@@ -0,0 +1,256 @@
+# app/autocomplete.py
+
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+from app import db
+from app.models import Author, Genre, Publisher, reading
+
+logger = logging.getLogger(__name__)
+
+KINDS = {'author': Author, 'genre': Genre, 'publisher': Publisher}
+KIND_OF = {model: kind for kind, model in KINDS.items()}
+# the columns a suggestion shows, the only ones read when an index is loaded
+COLUMNS = {'author': ('id', 'name', 'lastname'), 'genre': ('id', 'genre'), 'publisher': ('id', 'name')}
+STALE = float('-inf')
+
+
+def normalize(text: str) -> str:
+    """case-folded, whitespace-normalized form of a name, the way person_key folds it"""
+    return ' '.join(text.split()).casefold()
+
+
+def keys_of(kind: str, entry: Dict[str, Any]) -> List[str]:
+    """the normalized keys the entry is found by, authors both by 'lastname name' and 'name lastname'"""
+    if kind == 'author':
+        return [normalize(f"{entry['lastname']} {entry['name']}"), normalize(f"{entry['name']} {entry['lastname']}")]
+    return [normalize(entry[COLUMNS[kind][1]])]
+
+
+def suggestion(target) -> Tuple[List[str], Dict[str, Any]]:
+    """returns the normalized keys an author, genre or publisher is found by and what is suggested for it"""
+    kind = KIND_OF[type(target)]
+    entry = {column: getattr(target, column) for column in COLUMNS[kind]}
+    return keys_of(kind, entry), entry
+
+
+class PrefixIndex:
+    """sorted list of normalized keys searched with bisect, every key points at the entries found by it"""
+
+    def __init__(self, entries: Iterable[Tuple[List[str], Dict[str, Any]]] = ()):
+        self._entries: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        self._keys_of: Dict[int, List[str]] = {}
+        for keys, entry in entries:
+            self._keys_of[entry['id']] = keys
+            for key in keys:
+                self._entries.setdefault(key, {})[entry['id']] = entry
+        self._keys = sorted(self._entries)
+
+    def add(self, keys: List[str], entry: Dict[str, Any]) -> None:
+        self.remove(entry['id'])
+        self._keys_of[entry['id']] = keys
+        for key in keys:
+            if key not in self._entries:
+                self._entries[key] = {}
+                insort(self._keys, key)
+            self._entries[key][entry['id']] = entry
+
+    def remove(self, entry_id: int) -> None:
+        for key in self._keys_of.pop(entry_id, ()):
+            entries = self._entries.get(key, {})
+            entries.pop(entry_id, None)
+            if not entries:
+                self._entries.pop(key, None)
+                index = bisect_left(self._keys, key)
+                if index < len(self._keys) and self._keys[index] == key:
+                    del self._keys[index]
+
+    def apply(self, change: str, keys: List[str], entry: Dict[str, Any]) -> None:
+        """applies a committed insert, update or delete"""
+        if change == 'delete':
+            self.remove(entry['id'])
+        else:
+            self.add(keys, entry)
+
+    def search(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        """returns up to limit entries having a key starting with prefix, in key order"""
+        found: Dict[int, Dict[str, Any]] = {}
+        index = bisect_left(self._keys, prefix)
+        while index < len(self._keys) and len(found) < limit and self._keys[index].startswith(prefix):
+            for entry_id, entry in self._entries[self._keys[index]].items():
+                found.setdefault(entry_id, entry)
+            index += 1
+        return list(found.values())[:limit]
+
+    def __len__(self) -> int:
+        return len(self._keys_of)
+
+
+class Autocomplete:
+    """in-process prefix indexes of author, genre and publisher names for typeahead;
+    each is loaded on its first lookup and kept current by the commits of this process,
+    and reloaded in the background after AUTOCOMPLETE_TTL seconds to pick up the writes of other processes,
+    the lookups meanwhile are answered from the index they replace"""
+
+    def __init__(self):
+        self.app = None
+        self.limit = 10
+        self.ttl = 60.0
+        self._indexes: Dict[str, PrefixIndex] = {}
+        self._loaded_at: Dict[str, float] = {}
+        # the kinds being loaded, with the changes committed meanwhile, None once a change could not be recorded
+        self._loading: Dict[str, threading.Event] = {}
+        self._pending: Dict[str, Optional[List[Tuple[str, List[str], Dict[str, Any]]]]] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        self.app = app
+        self.limit = app.config.get('AUTOCOMPLETE_LIMIT', 10)
+        self.ttl = app.config.get('AUTOCOMPLETE_TTL', 60.0)
+
+    @staticmethod
+    def read(kind: str) -> PrefixIndex:
+        """reads the names of the kind into a fresh index, only the columns in COLUMNS"""
+        model = KINDS[kind]
+        with reading():
+            rows = db.session.query(*(getattr(model, column) for column in COLUMNS[kind])).all()
+        return PrefixIndex((keys_of(kind, entry), entry) for entry in (row._asdict() for row in rows))
+
+    def load(self, kind: str) -> PrefixIndex:
+        """loads the index of the kind in the calling thread and returns it; while another caller loads it,
+        waits for that load instead of running a second one"""
+        while True:
+            with self._lock:
+                loading = self._loading.get(kind)
+                if loading is None:
+                    loading = self._begin(kind)
+                    break
+            loading.wait()
+            index = self._indexes.get(kind)
+            if index is not None:
+                return index
+        return self._load(kind, loading)
+
+    def refresh(self, kind: str) -> None:
+        """reloads the index of the kind in a background thread, unless it is being loaded already"""
+        with self._lock:
+            if kind in self._loading:
+                return
+            loading = self._begin(kind)
+        threading.Thread(target=self._refresh, args=(kind, loading), name='autocomplete-refresh', daemon=True).start()
+
+    def _begin(self, kind: str) -> threading.Event:
+        # called with the lock held
+        loading = self._loading[kind] = threading.Event()
+        self._pending[kind] = []
+        return loading
+
+    def _load(self, kind: str, loading: threading.Event) -> PrefixIndex:
+        try:
+            index = self.read(kind)
+            with self._lock:
+                # the commits made while reading may be missing from what was read, they are applied again
+                pending = self._pending[kind]
+                for change, keys, entry in pending or ():
+                    index.apply(change, keys, entry)
+                self._indexes[kind] = index
+                self._loaded_at[kind] = time.monotonic() if pending is not None else STALE
+            return index
+        finally:
+            with self._lock:
+                del self._loading[kind]
+                del self._pending[kind]
+            loading.set()
+
+    def _refresh(self, kind: str, loading: threading.Event) -> None:
+        with self.app.app_context():
+            try:
+                self._load(kind, loading)
+            except Exception:
+                logger.exception("reloading the %s autocomplete index failed", kind)
+            finally:
+                db.session.remove()
+
+    def expire(self, kinds: Iterable[str] = KINDS) -> None:
+        """marks the indexes of the kinds stale, their next lookup reloads them in the background"""
+        with self._lock:
+            for kind in kinds:
+                self._loaded_at[kind] = STALE
+                if kind in self._pending:
+                    self._pending[kind] = None
+
+    def suggest(self, kind: str, prefix: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """returns the authors, genres or publishers whose normalized name starts with the prefix"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        index = self._indexes.get(kind)
+        if index is None:
+            index = self.load(kind)
+        elif time.monotonic() - self._loaded_at[kind] > self.ttl:
+            self.refresh(kind)
+        with self._lock:
+            return index.search(prefix, limit or self.limit)
+
+    def apply(self, changes: List[Tuple[str, str, List[str], Dict[str, Any]]], stale: Set[str]) -> None:
+        """applies the committed inserts, updates and deletes, the stale kinds are reloaded instead"""
+        self.expire(stale)
+        with self._lock:
+            for change, kind, keys, entry in changes:
+                if kind in stale:
+                    continue
+                if self._pending.get(kind) is not None:
+                    self._pending[kind].append((change, keys, entry))
+                index = self._indexes.get(kind)
+                if index is not None:
+                    index.apply(change, keys, entry)
+
+    def stats(self) -> Dict[str, Any]:
+        return {kind: len(index) for kind, index in self._indexes.items()}
+
+
+autocomplete = Autocomplete()
+
+
+def _recorder(change: str):
+    def record(mapper, connection, target) -> None:
+        session = object_session(target)
+        if session is not None:
+            keys, entry = suggestion(target)
+            session.info.setdefault('autocomplete', []).append((change, KIND_OF[type(target)], keys, entry))
+    return record
+
+
+for model in KINDS.values():
+    for change in ('insert', 'update', 'delete'):
+        event.listen(model, f'after_{change}', _recorder(change))
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_changes(session) -> None:
+    # also fired when a savepoint is released, the changes wait for the outer commit
+    if session.transaction is not None and session.transaction.nested:
+        return
+    changes = session.info.pop('autocomplete', None)
+    stale = session.info.pop('autocomplete_stale', set())
+    if changes:
+        autocomplete.apply(changes, stale)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_changes(session, previous_transaction) -> None:
+    # a savepoint rollback undoes only some of the recorded changes, their kinds are reloaded after the commit
+    transaction = previous_transaction
+    while transaction is not None and not transaction.nested:
+        transaction = transaction.parent
+    if transaction is None:
+        session.info.pop('autocomplete', None)
+        session.info.pop('autocomplete_stale', None)
+    else:
+        session.info.setdefault('autocomplete_stale', set()).update(
+            kind for _, kind, _, _ in session.info.get('autocomplete', ())
+        )
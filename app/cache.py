@@ -0,0 +1,229 @@
+# app/cache.py
+
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+MISSING = object()
+
+
+class LRUCache:
+    """in-process cache keeping at most maxsize entries, each for at most ttl seconds"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """returns the cached value or MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskCache:
+    """cache kept in a small SQLite file, shared by every worker on the host"""
+
+    def __init__(self, path: str, maxsize: int = 256, ttl: float = 300):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local = threading.local()
+
+    @property
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, expires REAL)"
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key: Hashable) -> Any:
+        """returns the cached value or MISSING"""
+        row = self._connection.execute(
+            "SELECT value FROM cache WHERE key = ? AND expires >= ?", (repr(key), time.time())
+        ).fetchone()
+        if row is None:
+            return MISSING
+        return pickle.loads(row[0])
+
+    def set(self, key: Hashable, value: Any) -> None:
+        connection = self._connection
+        connection.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+            (repr(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time() + self.ttl)
+        )
+        connection.execute(
+            "DELETE FROM cache WHERE expires < ? OR key IN "
+            "(SELECT key FROM cache ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+            (time.time(), self.maxsize)
+        )
+
+    def clear(self) -> None:
+        self._connection.execute("DELETE FROM cache")
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT count(*) FROM cache").fetchone()[0]
+
+
+class NullCache:
+    """backend that never stores anything, used when caching is switched off"""
+
+    def get(self, key: Hashable) -> Any:
+        return MISSING
+
+    def set(self, key: Hashable, value: Any) -> None:
+        pass
+
+    def clear(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return 0
+
+
+class ReadCache:
+    """read-through cache for catalog reads; keys carry the catalog version,
+    so a write bumping the version makes every older entry unreachable"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or NullCache()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app) -> None:
+        """picks the backend from CACHE_BACKEND: 'lru', 'disk' or 'none'"""
+        name = app.config.get('CACHE_BACKEND', 'lru')
+        size = app.config.get('CACHE_SIZE', 256)
+        ttl = app.config.get('CACHE_TTL', 300)
+        if name == 'lru':
+            self.backend = LRUCache(maxsize=size, ttl=ttl)
+        elif name == 'disk':
+            self.backend = DiskCache(app.config['CACHE_PATH'], maxsize=size, ttl=ttl)
+        elif name == 'none':
+            self.backend = NullCache()
+        else:
+            raise ValueError(f"unknown cache backend: {name}")
+
+    def get_or_load(self, key: Tuple, loader: Callable[[], Any]) -> Any:
+        """returns the cached value for key, calling loader and storing its result on a miss"""
+        value = self.backend.get(key)
+        if value is not MISSING:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = loader()
+        self.backend.set(key, value)
+        return value
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / lookups if lookups else 0.0
+        }
+
+
+class FragmentCache:
+    """in-process cache of rendered template fragments or compressed bodies, least recently used first out
+    once their size passes max_bytes; keys carry the version stamp of what was rendered,
+    so a changed book misses and is rendered again while the others are reused"""
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, setting: str = 'FRAGMENT_CACHE_BYTES'):
+        self.max_bytes = max_bytes
+        self.setting = setting
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        """the setting (FRAGMENT_CACHE_BYTES by default) caps the memory taken by the fragments,
+        0 turns the cache off"""
+        self.max_bytes = app.config.get(self.setting, self.max_bytes)
+
+    def get_or_render(self, key: Hashable, render: Callable[[], Any]) -> Any:
+        """returns the fragment stored under key, rendering and storing it on a miss"""
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return fragment
+            self.misses += 1
+        fragment = render()
+        size = sys.getsizeof(fragment)
+        if size > self.max_bytes:
+            return fragment
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = fragment
+                self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= sys.getsizeof(evicted)
+                self.evictions += 1
+        return fragment
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / lookups if lookups else 0.0
+        }
+
+
+cache = ReadCache()
+fragments = FragmentCache()
+compressed = FragmentCache(setting='COMPRESS_CACHE_BYTES')
@@ -0,0 +1,120 @@
+# app/cli.py
+
+import click
+import time
+from flask.cli import with_appcontext
+from app import db
+from app.cache import cache
+from app.models import Book, Author, Genre, Publisher, Borrower, BorrowedBookCard, CatalogVersion, CatalogView, \
+    FacetCount, Loan
+from app.importer import import_books as import_book_rows, BATCH_SIZE
+from app.exporter import export_books as export_book_rows, FORMATS
+from app.maintenance import Maintenance, BATCH_SIZE as MAINTENANCE_BATCH_SIZE
+from app.writer import writer
+
+
+def make_shell_context():
+    return {
+        "db": db,
+        "Book": Book,
+        "Author": Author,
+        "Genre": Genre,
+        "Publisher": Publisher,
+        "Borrower": Borrower,
+        "BorrowedBookCard": BorrowedBookCard,
+        "CatalogVersion": CatalogVersion,
+        "CatalogView": CatalogView,
+        "FacetCount": FacetCount,
+        "Loan": Loan,
+        "cache": cache,
+        "writer": writer
+    }
+
+
+@click.command("import-books")
+@click.argument("source", type=click.File("r", encoding="utf-8"))
+@click.option("--format", "fmt", type=click.Choice(["csv", "jsonl"]), help="defaults to the file extension")
+@click.option("--batch-size", default=BATCH_SIZE, show_default=True, help="books inserted per transaction")
+@with_appcontext
+def import_books(source, fmt, batch_size):
+    """imports books from a csv or jsonl file ('-' reads stdin)"""
+    fmt = fmt or source.name.rsplit(".", 1)[-1].lower()
+    if fmt not in ("csv", "jsonl"):
+        raise click.BadParameter("cannot tell the format from the file name, use --format", param_hint="--format")
+    start = time.perf_counter()
+    importer = import_book_rows(source, fmt, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    for number, reason in importer.errors:
+        click.echo(f"row {number}: {reason}", err=True)
+    rows = importer.imported + importer.skipped + importer.invalid
+    click.echo(f"imported {importer.imported} books, skipped {importer.skipped}, "
+               f"rejected {importer.invalid} invalid in {elapsed:.2f}s ({rows / elapsed:.0f} rows/s)")
+
+
+@click.command("export-books")
+@click.argument("target", type=click.File("wb"), default="-")
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default="csv", show_default=True)
+@click.option("--gzip", is_flag=True, help="gzip the output on the fly")
+@with_appcontext
+def export_books(target, fmt, gzip):
+    """exports every book to a csv or jsonl file ('-' writes to stdout)"""
+    for chunk in export_book_rows(Book().iter_catalog(), fmt, gzip=gzip):
+        target.write(chunk)
+
+
+@click.command("rebuild-catalog-view")
+@with_appcontext
+def rebuild_catalog_view():
+    """rebuilds the catalog_view table from scratch, needed after running with CATALOG_VIEW off"""
+    start = time.perf_counter()
+    rows = CatalogView.rebuild()
+    CatalogVersion.bump()
+    db.session.commit()
+    click.echo(f"rebuilt catalog_view with {rows} books in {time.perf_counter() - start:.2f}s")
+
+
+@click.command("rebuild-facet-counts")
+@with_appcontext
+def rebuild_facet_counts():
+    """recounts the facet_count table from scratch"""
+    start = time.perf_counter()
+    rows = FacetCount.rebuild()
+    CatalogVersion.bump()
+    db.session.commit()
+    click.echo(f"rebuilt facet_count with {rows} values in {time.perf_counter() - start:.2f}s")
+
+
+@click.command("maintain")
+@click.option("--batch-size", default=MAINTENANCE_BATCH_SIZE, show_default=True, help="orphans deleted per transaction")
+@click.option("--dry-run", is_flag=True, help="only count the orphans")
+@click.option("--no-vacuum", is_flag=True, help="skip PRAGMA incremental_vacuum")
+@click.option("--no-analyze", is_flag=True, help="skip ANALYZE and PRAGMA optimize")
+@click.option("--full-vacuum", is_flag=True,
+              help="switch a database made without auto_vacuum=INCREMENTAL over with a one-time VACUUM")
+@with_appcontext
+def maintain(batch_size, dry_run, no_vacuum, no_analyze, full_vacuum):
+    """deletes orphaned authors, genres, publishers, links and cards, reclaims free pages and runs ANALYZE"""
+    from flask import current_app
+
+    maintenance = Maintenance(batch_size, current_app.config.get('MAINTENANCE_ANALYSIS_LIMIT', 1000))
+    if dry_run:
+        for table, count in maintenance.count_orphans().items():
+            click.echo(f"{table}: {count} orphans")
+        return
+    report = maintenance.run(vacuum=not no_vacuum, analyze=not no_analyze, full_vacuum=full_vacuum)
+    for table, count in report['deleted'].items():
+        if count:
+            click.echo(f"{table}: deleted {count}")
+    click.echo(f"deleted {sum(report['deleted'].values())} orphans, reclaimed {report['pages_reclaimed']} pages "
+               f"({report['bytes_reclaimed'] / 1024:.0f} KiB), {report['pages_after']} pages left, "
+               f"{report['free_pages']} free in {report['seconds']:.2f}s")
+    if report['auto_vacuum'] != 'incremental' and not no_vacuum:
+        click.echo(f"auto_vacuum is {report['auto_vacuum']}, the {report['free_pages']} free pages stay in the file "
+                   f"until it is switched over with --full-vacuum")
+
+
+def init_app(app) -> None:
+    """registers the shell context and the library commands"""
+    app.shell_context_processor(make_shell_context)
+    for command in (import_books, export_books, rebuild_catalog_view, rebuild_facet_counts, maintain):
+        app.cli.add_command(command)
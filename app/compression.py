@@ -0,0 +1,76 @@
+# app/compression.py
+
+import hashlib
+import zlib
+from typing import Iterable, Iterator
+from flask import request
+from app.cache import compressed
+
+# zlib window bits giving each content coding its container
+WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+MIMETYPES = ('text/html', 'text/plain', 'text/csv', 'application/json', 'application/x-ndjson')
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, WBITS[encoding])
+    return compressor.compress(data) + compressor.flush()
+
+
+def compress_chunks(chunks: Iterable[bytes], encoding: str, level: int) -> Iterator[bytes]:
+    """compresses a streamed body on the fly, keeping only the compressor state in memory"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, WBITS[encoding])
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def weaken_etag(response) -> None:
+    # the compressed body differs byte for byte from the identity one, only a weak validator holds for both
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def init_app(app) -> None:
+    """compresses text responses with gzip or deflate, whichever the client accepts, when COMPRESS is on:
+    bodies of at least COMPRESS_MIN_SIZE bytes at COMPRESS_LEVEL and streamed bodies as they are sent;
+    a response carrying the version-stamped ETag of conditional() is kept compressed in the compressed cache
+    under the hash of its own body, never the ETag, since pages sharing an ETag differ in their CSRF token"""
+    if not app.config.get('COMPRESS'):
+        return
+    level = app.config.get('COMPRESS_LEVEL', 6)
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 500)
+    compressed.init_app(app)
+
+    @app.after_request
+    def compress_response(response):
+        if response.mimetype not in MIMETYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(WBITS)
+        if encoding is None or 'Content-Encoding' in response.headers:
+            return response
+        if response.status_code == 304:
+            weaken_etag(response)
+            return response
+        if response.status_code != 200 or response.direct_passthrough:
+            return response
+        if response.is_streamed:
+            response.response = compress_chunks(response.iter_encoded(), encoding, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            etag, _ = response.get_etag()
+            if etag is None:
+                response.set_data(compress(data, encoding, level))
+            else:
+                response.set_data(compressed.get_or_render(
+                    ('compressed', encoding, hashlib.sha1(data).digest()), lambda: compress(data, encoding, level)
+                ))
+        response.headers['Content-Encoding'] = encoding
+        weaken_etag(response)
+        return response
@@ -0,0 +1,54 @@
+# app/exporter.py
+
+import csv
+import io
+import json
+from typing import Dict, Iterable, Iterator
+from app.compression import compress_chunks
+
+FIELDS = ('id', 'title', 'author', 'genre', 'publisher', 'rating', 'description', 'status')
+FORMATS = ('csv', 'jsonl')
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+CHUNK_SIZE = 64 * 1024
+GZIP_LEVEL = 6
+
+
+def export_lines(books: Iterable[Dict[str, object]], fmt: str) -> Iterator[str]:
+    """serializes the books one line at a time as csv (with a header line) or jsonl"""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        for book in books:
+            writer.writerow(book)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    elif fmt == 'jsonl':
+        for book in books:
+            yield json.dumps({field: book[field] for field in FIELDS}, ensure_ascii=False) + '\n'
+    else:
+        raise ValueError(f"unknown format: {fmt}")
+
+
+def encode_chunks(lines: Iterable[str], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """encodes the lines as utf-8 and groups them into chunks of about chunk_size bytes"""
+    chunk = []
+    size = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        chunk.append(data)
+        size += len(data)
+        if size >= chunk_size:
+            yield b''.join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield b''.join(chunk)
+
+
+def export_books(books: Iterable[Dict[str, object]], fmt: str, gzip: bool = False) -> Iterator[bytes]:
+    """streams the books as csv or jsonl bytes, gzipped if asked to"""
+    chunks = encode_chunks(export_lines(books, fmt))
+    return compress_chunks(chunks, 'gzip', GZIP_LEVEL) if gzip else chunks
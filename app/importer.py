@@ -0,0 +1,163 @@
+# app/importer.py
+
+import csv
+import json
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, TextIO, Tuple
+from app import db
+from app.models import Book, Author, CatalogVersion, CatalogView, FacetCount, Genre, Publisher, bibliographies, \
+    person_key
+
+BATCH_SIZE = 500
+FIELDS = ('title', 'author_name', 'author_lastname', 'genre', 'publisher', 'rating', 'description')
+RATINGS = range(11)
+# invalid rows reported with their reason, the rest are only counted
+REPORTED = 20
+
+
+class InvalidRow(ValueError):
+    """a row that cannot be imported"""
+
+
+def read_rows(stream: TextIO, fmt: str) -> Iterator[object]:
+    """reads book rows from a csv (with a header line) or jsonl stream one by one,
+    a jsonl line that is not valid JSON is read as None and rejected by normalize like any non-object"""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'jsonl':
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None
+    else:
+        raise ValueError(f"unknown format: {fmt}")
+
+
+def normalize(row: object) -> Dict[str, object]:
+    """normalizes a row the way Book.add_book does, raises InvalidRow if it is not an object,
+    a required field is missing, a field is not text or the rating is not a whole number in RATINGS"""
+    if not isinstance(row, dict):
+        raise InvalidRow("not a JSON object")
+    for field in FIELDS:
+        value = row.get(field)
+        if value is not None and not isinstance(value, str) and not (field == 'rating' and type(value) is int):
+            raise InvalidRow(f"{field} is not text")
+    missing = [field for field in FIELDS[:5] if not (row.get(field) or '').strip()]
+    if missing:
+        raise InvalidRow(f"missing {', '.join(missing)}")
+    rating = row.get('rating')
+    if rating in (None, ''):
+        rating = None
+    else:
+        try:
+            rating = int(rating)
+        except ValueError:
+            raise InvalidRow(f"rating {rating!r} is not a number") from None
+        if rating not in RATINGS:
+            raise InvalidRow(f"rating {rating} is out of range")
+    return {
+        'title': row['title'].strip().title(),
+        'author_name': row['author_name'].strip().title(),
+        'author_lastname': row['author_lastname'].strip().title(),
+        'genre': row['genre'].strip().capitalize(),
+        'publisher': row['publisher'].strip().title(),
+        'rating': rating,
+        'description': row.get('description') or ''
+    }
+
+
+class BookImporter:
+    """imports books in batches, resolving authors, genres and publishers
+    through name -> id maps loaded once instead of an is_in_base query per row"""
+
+    def __init__(self, batch_size: int = BATCH_SIZE):
+        self.batch_size = batch_size
+        self.imported = 0
+        self.skipped = 0
+        self.invalid = 0
+        self.errors = []
+        self.titles = {title for title, in db.session.query(Book.title)}
+        self.genres = {genre: _id for _id, genre in db.session.query(Genre.id, Genre.genre)}
+        self.publishers = {name: _id for _id, name in db.session.query(Publisher.id, Publisher.name)}
+        self.authors = {key: _id for _id, key in db.session.query(Author.id, Author.lookup_key)}
+
+    def run(self, rows: Iterable[Dict[str, str]]) -> None:
+        """imports the rows, committing once per batch; rows already in the catalog are skipped,
+        invalid ones are counted and the first REPORTED of them kept in errors with their row number"""
+        batch = []
+        for number, row in enumerate(rows, 1):
+            try:
+                book = normalize(row)
+            except InvalidRow as error:
+                self.invalid += 1
+                if len(self.errors) < REPORTED:
+                    self.errors.append((number, str(error)))
+                continue
+            if book['title'] in self.titles:
+                self.skipped += 1
+                continue
+            self.titles.add(book['title'])
+            batch.append(book)
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+
+    def import_batch(self, batch: List[Dict[str, object]]) -> None:
+        """inserts one batch of new books with their missing authors, genres and publishers in one transaction"""
+        self.add_genres({book['genre'] for book in batch})
+        self.add_publishers({book['publisher'] for book in batch})
+        self.add_authors({person_key(book['author_name'], book['author_lastname']):
+                          (book['author_name'], book['author_lastname']) for book in batch})
+        db.session.execute(Book.__table__.insert(), [{
+            'title': book['title'],
+            'rating': book['rating'],
+            'description': book['description'],
+            'genre_id': self.genres[book['genre']],
+            'publisher_id': self.publishers[book['publisher']]
+        } for book in batch])
+        book_ids = dict(db.session.query(Book.title, Book.id).filter(Book.title.in_([book['title'] for book in batch])))
+        db.session.execute(bibliographies.insert(), [{
+            'book_id': book_ids[book['title']],
+            'author_id': self.authors[person_key(book['author_name'], book['author_lastname'])]
+        } for book in batch])
+        CatalogView.refresh(book_ids.values())
+        FacetCount.adjust(Counter(), FacetCount.book_facets(list(book_ids.values())))
+        CatalogVersion.bump()
+        db.session.commit()
+        self.imported += len(batch)
+
+    def add_genres(self, names: set) -> None:
+        new = [name for name in names if name not in self.genres]
+        if new:
+            db.session.execute(Genre.__table__.insert(), [{'genre': name} for name in new])
+            self.genres.update({genre: _id for _id, genre in db.session.query(Genre.id, Genre.genre).filter(Genre.genre.in_(new))})
+
+    def add_publishers(self, names: set) -> None:
+        new = [name for name in names if name not in self.publishers]
+        if new:
+            db.session.execute(Publisher.__table__.insert(), [{'name': name} for name in new])
+            self.publishers.update({name: _id for _id, name in db.session.query(Publisher.id, Publisher.name).filter(Publisher.name.in_(new))})
+
+    def add_authors(self, names: Dict[str, Tuple[str, str]]) -> None:
+        new = {key: name for key, name in names.items() if key not in self.authors}
+        if new:
+            db.session.execute(Author.__table__.insert(), [
+                {'name': name, 'lastname': lastname} for name, lastname in new.values()
+            ])
+            self.authors.update(db.session.query(Author.lookup_key, Author.id).filter(Author.lookup_key.in_(new)))
+
+
+def import_books(stream: TextIO, fmt: str, batch_size: int = BATCH_SIZE) -> BookImporter:
+    """imports books from a csv or jsonl stream and returns the importer with the numbers of
+    imported, skipped and invalid rows and the reported errors"""
+    importer = BookImporter(batch_size=batch_size)
+    try:
+        importer.run(read_rows(stream, fmt))
+    except Exception:
+        db.session.rollback()
+        raise
+    return importer
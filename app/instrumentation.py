@@ -0,0 +1,124 @@
+# app/instrumentation.py
+
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, List
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_installed = False
+_local = threading.local()
+
+
+class QueryStats:
+    """number, total time and per-statement counts of the queries run in a request or a block"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    def most_repeated(self):
+        """returns (statement, times) of the statement run most often, or (None, 0)"""
+        repeated = self.statements.most_common(1)
+        return repeated[0] if repeated else (None, 0)
+
+
+class RepeatedQueryError(AssertionError):
+    """raised by max_repeats when a statement runs more often than allowed, the N+1 pattern"""
+
+
+def _collectors() -> List[QueryStats]:
+    if not hasattr(_local, 'collectors'):
+        _local.collectors = []
+    return _local.collectors
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info['query_start'].pop()
+    for stats in _collectors():
+        stats.record(statement, duration)
+    if has_request_context() and 'sql_stats' in g:
+        g.sql_stats.record(statement, duration)
+        threshold = g.sql_slow_query_ms
+        if threshold is not None and duration * 1000 >= threshold:
+            logger.warning("slow query (%.1f ms): %s %r", duration * 1000, statement, parameters)
+
+
+def install() -> None:
+    """hooks the query timers into every engine, safe to call more than once"""
+    global _installed
+    if not _installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _installed = True
+
+
+def init_app(app) -> None:
+    """counts the queries and database time of every request when SQL_INSTRUMENTATION is on,
+    logs statements slower than SQL_SLOW_QUERY_MS and reports both in a Server-Timing header"""
+    if not app.config.get('SQL_INSTRUMENTATION'):
+        return
+    install()
+    slow_query_ms = app.config.get('SQL_SLOW_QUERY_MS')
+    max_repeats_per_request = app.config.get('SQL_MAX_REPEATS')
+
+    @app.before_request
+    def start_query_stats():
+        g.sql_stats = QueryStats()
+        g.sql_slow_query_ms = slow_query_ms
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        response.headers.add(
+            'Server-Timing', f'db;desc="{stats.count} queries";dur={stats.duration * 1000:.1f}'
+        )
+        statement, times = stats.most_repeated()
+        if max_repeats_per_request is not None and times > max_repeats_per_request:
+            logger.warning("statement run %d times in one request: %s", times, statement)
+        return response
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryStats]:
+    """collects the queries run in the current thread inside the block"""
+    install()
+    stats = QueryStats()
+    _collectors().append(stats)
+    try:
+        yield stats
+    finally:
+        _collectors().remove(stats)
+
+
+@contextmanager
+def max_repeats(limit: int) -> Iterator[QueryStats]:
+    """fails with RepeatedQueryError when the same parameterized statement runs more than
+    limit times inside the block, e.g. once per catalog row
+
+        with max_repeats(1):
+            client.get('/library/')
+    """
+    with count_queries() as stats:
+        yield stats
+    statement, times = stats.most_repeated()
+    if times > limit:
+        raise RepeatedQueryError(f"statement run {times} times (limit {limit}): {statement}")
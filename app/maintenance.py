@@ -0,0 +1,226 @@
+# app/maintenance.py
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+from sqlalchemy import text
+from app import db
+from app.models import CatalogVersion, serialized, unit_of_work
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+ANALYSIS_LIMIT = 1000
+AUTO_VACUUM = {0: 'none', 1: 'full', 2: 'incremental'}
+
+# (table, key column, query selecting the keys of the rows nothing refers to any more), in the order they are
+# collected: the links and rows left by deleted books first, then what only those links referred to;
+# NOT IN reads the unindexed columns once instead of once per row; loans are history and are never collected
+ORPHANS = (
+    ('bibliographies', 'rowid',
+     "SELECT rowid FROM bibliographies WHERE book_id NOT IN (SELECT id FROM book) "
+     "OR author_id NOT IN (SELECT id FROM author)"),
+    ('catalog_view', 'book_id', "SELECT book_id FROM catalog_view WHERE book_id NOT IN (SELECT id FROM book)"),
+    ('facet_count', 'rowid', "SELECT rowid FROM facet_count WHERE count <= 0"),
+    ('author', 'id',
+     "SELECT id FROM author WHERE NOT EXISTS "
+     "(SELECT 1 FROM bibliographies WHERE bibliographies.author_id = author.id)"),
+    ('genre', 'id', "SELECT id FROM genre WHERE NOT EXISTS (SELECT 1 FROM book WHERE book.genre_id = genre.id)"),
+    ('publisher', 'id',
+     "SELECT id FROM publisher WHERE NOT EXISTS (SELECT 1 FROM book WHERE book.publisher_id = publisher.id)"),
+    ('borrowed_book_card', 'id',
+     "SELECT id FROM borrowed_book_card WHERE NOT EXISTS "
+     "(SELECT 1 FROM book WHERE book.borrowed_book_card_id = borrowed_book_card.id)"),
+    ('borrower', 'id',
+     "SELECT id FROM borrower WHERE id NOT IN "
+     "(SELECT borrower_id FROM borrowed_book_card WHERE borrower_id IS NOT NULL) "
+     "AND id NOT IN (SELECT borrower_id FROM loan)"),
+)
+AUTOCOMPLETE_KINDS = {'author', 'genre', 'publisher'}
+
+
+class Maintenance:
+    """removes the rows left behind by deleted books and renamed authors, genres and publishers in batches
+    of batch_size, each committed on its own so writers wait for one batch at most, then gives the freed pages
+    back to the file system with incremental_vacuum and refreshes the planner statistics"""
+
+    def __init__(self, batch_size: int = BATCH_SIZE, analysis_limit: int = ANALYSIS_LIMIT):
+        self.batch_size = batch_size
+        self.analysis_limit = analysis_limit
+
+    def count_orphans(self) -> Dict[str, int]:
+        return {table: db.session.execute(text(f"SELECT count(*) FROM ({orphans})")).scalar()
+                for table, _, orphans in ORPHANS}
+
+    @serialized
+    def delete_batch(self, table: str, key: str, orphans: str) -> int:
+        """deletes at most batch_size orphans of the table and returns how many were deleted"""
+        with unit_of_work():
+            deleted = db.session.execute(
+                text(f"DELETE FROM {table} WHERE {key} IN ({orphans} LIMIT :limit)"), {'limit': self.batch_size}
+            ).rowcount
+            if deleted:
+                CatalogVersion.bump()
+        return deleted
+
+    def collect_orphans(self) -> Dict[str, int]:
+        """deletes every orphan and returns how many rows of each table were deleted"""
+        from app.autocomplete import autocomplete
+
+        deleted = {}
+        for table, key, orphans in ORPHANS:
+            deleted[table] = 0
+            while True:
+                count = self.delete_batch(table, key, orphans)
+                deleted[table] += count
+                if count < self.batch_size:
+                    break
+        # the bulk deletes bypass the mapper events keeping the indexes current
+        autocomplete.expire(table for table in AUTOCOMPLETE_KINDS if deleted[table])
+        return deleted
+
+    def pages(self, connection) -> Dict[str, int]:
+        return {name: connection.execute(f"PRAGMA {name}").scalar()
+                for name in ('page_count', 'freelist_count', 'page_size', 'auto_vacuum')}
+
+    def vacuum(self, connection, full: bool = False) -> None:
+        """frees the pages on the freelist, which takes auto_vacuum=INCREMENTAL; full=True switches a database
+        made without it over with a one-time VACUUM, which rewrites the whole file and locks it meanwhile"""
+        if full:
+            connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            connection.execute("VACUUM")
+        # every step of the pragma frees one page and pysqlite's execute() takes only the first one,
+        # executescript() runs it to the end
+        connection.connection.executescript("PRAGMA incremental_vacuum")
+
+    def analyze(self, connection) -> None:
+        """refreshes the planner statistics, reading at most analysis_limit rows of every index"""
+        connection.connection.executescript(
+            f"PRAGMA analysis_limit = {self.analysis_limit}; ANALYZE; PRAGMA optimize"
+        )
+
+    def run(self, vacuum: bool = True, analyze: bool = True, full_vacuum: bool = False) -> Dict[str, Any]:
+        """collects the orphans, vacuums and analyzes, and reports what was deleted and the pages reclaimed"""
+        start = time.perf_counter()
+        with db.engine.connect() as connection:
+            before = self.pages(connection)
+            deleted = self.collect_orphans()
+            freed = connection.execute("PRAGMA freelist_count").scalar()
+            if vacuum:
+                self.vacuum(connection, full=full_vacuum and before['auto_vacuum'] != 2)
+            if analyze:
+                self.analyze(connection)
+            after = self.pages(connection)
+        return {
+            'deleted': deleted,
+            'auto_vacuum': AUTO_VACUUM.get(after['auto_vacuum'], after['auto_vacuum']),
+            'page_size': after['page_size'],
+            'pages_before': before['page_count'],
+            'pages_after': after['page_count'],
+            'pages_reclaimed': before['page_count'] - after['page_count'],
+            'bytes_reclaimed': (before['page_count'] - after['page_count']) * after['page_size'],
+            'free_pages': after['freelist_count'],
+            'pages_freed': freed - before['freelist_count'],
+            'seconds': round(time.perf_counter() - start, 3)
+        }
+
+
+@contextmanager
+def exclusive(path: str) -> Iterator[bool]:
+    """holds an exclusive lock on the file while the block runs, yields False when another process holds it;
+    without a path or fcntl every process runs its own rounds"""
+    if not path or fcntl is None:
+        yield True
+        return
+    with open(path, 'a') as file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+class MaintenanceScheduler:
+    """runs the maintenance every MAINTENANCE_INTERVAL seconds in a background thread of the process,
+    off the request path; the workers of one deployment take turns through the MAINTENANCE_LOCK file,
+    so a round runs in one of them only"""
+
+    def __init__(self):
+        self.app = None
+        self.interval = 0.0
+        self.lock_path = None
+        self.last_report: Optional[Dict[str, Any]] = None
+        self.runs = 0
+        self.failures = 0
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        """turned on by a MAINTENANCE_INTERVAL above 0, the thread starts with the first request of the process"""
+        self.app = app
+        self.interval = app.config.get('MAINTENANCE_INTERVAL', 0)
+        self.lock_path = app.config.get('MAINTENANCE_LOCK')
+        if self.interval > 0:
+            app.before_request(self._start)
+
+    def _start(self) -> None:
+        # a forked worker inherits the scheduler but not the thread
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name='library-maintenance', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            self.run_once()
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """runs one round unless another process is running one, and returns its report"""
+        with self.app.app_context():
+            try:
+                with exclusive(self.lock_path) as acquired:
+                    if not acquired:
+                        return None
+                    report = Maintenance(
+                        batch_size=self.app.config.get('MAINTENANCE_BATCH_SIZE', BATCH_SIZE),
+                        analysis_limit=self.app.config.get('MAINTENANCE_ANALYSIS_LIMIT', ANALYSIS_LIMIT)
+                    ).run()
+            except Exception:
+                self.failures += 1
+                logger.exception("maintenance failed")
+                return None
+            finally:
+                db.session.remove()
+        self.runs += 1
+        self.last_report = report
+        logger.info("maintenance deleted %d orphans and reclaimed %d pages in %.2fs",
+                    sum(report['deleted'].values()), report['pages_reclaimed'], report['seconds'])
+        return report
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'interval': self.interval,
+            'runs': self.runs,
+            'failures': self.failures,
+            'last_report': self.last_report
+        }
+
+
+scheduler = MaintenanceScheduler()
@@ -1,13 +1,171 @@
 # app/models.py
 
+from flask import current_app
 from app import db
-from typing import List, Dict, Union
-from datetime import date
+from app.cache import cache
+from app.writer import writer
+from sqlalchemy import bindparam, case, event, func, literal, select, text, union_all, and_, or_
+from sqlalchemy.orm import aliased, joinedload, selectinload
+from typing import List, Dict, Union, Tuple, Optional, Iterator, Iterable
+from datetime import date, datetime, timedelta
+from functools import wraps
+from collections import Counter
+from contextlib import contextmanager
+import base64
+import json
+
+BORROWED = 'pożyczona'
+ON_SHELF = 'na półce'
+PAGE_SIZE = 50
+YIELD_PER = 500
+SORT_KEYS = ('title', 'author', 'rating', 'genre')
+LOAN_STATUSES = ('borrowed', 'available')
+FACETS = ('genre', 'publisher', 'author', 'rating', 'status')
+FACET_LIMIT = 20
+RATING_BUCKETS = ((0, 3), (4, 6), (7, 8), (9, 10))
+NO_RATING = 'brak'
+API_FIELDS = ('id', 'title', 'authors', 'genre', 'publisher', 'rating', 'description', 'status', 'version',
+              'updated_at')
+
+
+class BookOnLoan(RuntimeError):
+    """raised when deleting a book that is out on loan"""
+
+
+@contextmanager
+def unit_of_work():
+    """runs the enclosed operations in one transaction, committed once at the end or rolled back on error;
+    model write methods open one themselves, so nesting them in an outer unit batches them together"""
+    depth = db.session.info.get('unit_of_work', 0)
+    db.session.info['unit_of_work'] = depth + 1
+    try:
+        yield db.session
+        if not depth:
+            db.session.commit()
+    except Exception:
+        if not depth:
+            db.session.rollback()
+        raise
+    finally:
+        db.session.info['unit_of_work'] = depth
+
+
+def serialized(method):
+    """hands the write over to the write queue when WRITE_QUEUE is on; calls made by the writer itself,
+    inside an outer unit of work or with unflushed changes in the session run in place"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        session = db.session
+        if not writer.enabled or writer.in_writer() or session.info.get('unit_of_work') \
+                or session.new or session.dirty or session.deleted:
+            return method(self, *args, **kwargs)
+        result = writer.submit(method, self, *args, **kwargs)
+        # ends the read snapshot of the caller so it sees the write
+        session.rollback()
+        return result
+    return wrapper
+
+
+@contextmanager
+def reading():
+    """sends the enclosed queries to the read-only connections when the app keeps them (SQLITE_READ_ONLY),
+    queries made inside a unit of work or with unflushed changes still go to the primary ones"""
+    session = db.session()
+    previous = session.info.get('read_only', False)
+    session.info['read_only'] = True
+    try:
+        yield session
+    finally:
+        session.info['read_only'] = previous
+
+
+def read_only(method):
+    """runs the method, which must not write, on the read-only connections"""
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        with reading():
+            return method(*args, **kwargs)
+    return wrapper
+
+
+def person_key(name: str, lastname: str) -> str:
+    """case-folded, whitespace-normalized key identifying an author or borrower by name and lastname"""
+    return f"{' '.join(lastname.split()).casefold()}\t{' '.join(name.split()).casefold()}"
+
+
+def _person_key_default(context) -> Optional[str]:
+    parameters = context.get_current_parameters()
+    if parameters.get('name') is None or parameters.get('lastname') is None:
+        return None
+    return person_key(parameters['name'], parameters['lastname'])
+
+
+def rating_bucket(rating) -> object:
+    """SQL expression naming the RATING_BUCKETS range the rating falls into, e.g. '4-6'"""
+    return case(
+        [(rating.is_(None), NO_RATING)] + [(rating <= high, f'{low}-{high}') for low, high in RATING_BUCKETS[:-1]],
+        else_='{}-{}'.format(*RATING_BUCKETS[-1])
+    )
+
+
+def loan_status(borrowed) -> object:
+    """SQL expression naming the LOAN_STATUSES entry of a borrowed flag"""
+    return case([(borrowed.is_(True), LOAN_STATUSES[0])], else_=LOAN_STATUSES[1])
+
+
+def more_than_one(query) -> bool:
+    """tells if the query has at least two rows, reading no more than two of them"""
+    return query.limit(1).offset(1).first() is not None
+
+
+def cached(name: str):
+    """caches the method result under the current catalog version and the call arguments"""
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            key = (name, CatalogVersion.current(), args, tuple(sorted(kwargs.items())))
+            return cache.get_or_load(key, lambda: method(self, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def encode_cursor(value: Union[str, int, None], book_id: int) -> str:
+    """packs the sort value and id of the last row on a page into an url-safe cursor"""
+    raw = json.dumps([value, book_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Union[str, int, None], int]:
+    """unpacks a cursor made by encode_cursor, raises ValueError if it is malformed
+    or holds anything but a string, number or null and an integer id"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, book_id = json.loads(raw)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+    if type(book_id) is not int or not (value is None or type(value) in (str, int, float)):
+        raise ValueError(f"invalid cursor: {cursor}")
+    return value, book_id
+
+
+def keyset_ranges(column, value, book_id: int, descending: bool = False, id_column=None) -> list:
+    """the filters of the rows after (value, book_id) in (column, id) order, as consecutive ranges that
+    SQLite each reads with one seek of the (column, id) index: the rest of the rows sharing the value,
+    then the values past it; NULLs sort first ascending and last descending, as they do in SQLite"""
+    id_column = Book.id if id_column is None else id_column
+    if descending:
+        if value is None:
+            return [and_(column.is_(None), id_column < book_id)]
+        return [and_(column == value, id_column < book_id), column < value, column.is_(None)]
+    if value is None:
+        return [and_(column.is_(None), id_column > book_id), column.isnot(None)]
+    return [and_(column == value, id_column > book_id), column > value]
 
 bibliographies = db.Table(
     'bibliographies',
     db.Column('book_id', db.Integer, db.ForeignKey('book.id'), primary_key=True),
-    db.Column('author_id', db.Integer, db.ForeignKey('author.id'), primary_key=True)
+    db.Column('author_id', db.Integer, db.ForeignKey('author.id'), primary_key=True),
+    db.Index('ix_bibliographies_author_id_book_id', 'author_id', 'book_id')
 )
 
 
@@ -15,14 +173,16 @@ class Author(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(20), index=True)
     lastname = db.Column(db.String(30), index=True)
-    bibliographies = db.relationship('Book', secondary=bibliographies, backref="authors", lazy='subquery')
+    lookup_key = db.Column(db.String(60), index=True, unique=True, default=_person_key_default)
+    bibliographies = db.relationship('Book', secondary=bibliographies, backref="authors", lazy='select')
 
+    @read_only
     def is_in_base(self, author_name: str, author_lastname: str) -> List[int]:
-        """checks if the author is in the database"""
-        _authors = self.query.filter_by(name=author_name).all()
-        if _authors is not None:
-            author_id = [author.id for author in _authors if author.lastname == author_lastname]
-            return author_id
+        """checks if the author is in the database with one lookup of the normalized key"""
+        author = db.session.query(Author.id).filter(
+            Author.lookup_key == person_key(author_name, author_lastname)
+        ).first()
+        return [author.id] if author is not None else []
 
     def add_author(self, author_name: str, author_lastname: str) -> object:
         """adds author to database and returns it, if author exists in database returns existing author"""
@@ -30,7 +190,7 @@ class Author(db.Model):
         if not bool(_id):
             author = Author(name=author_name, lastname=author_lastname)
             db.session.add(author)
-            db.session.commit()
+            db.session.flush()
             return author
         return self.query.get(_id[0])
 
@@ -38,26 +198,36 @@ class Author(db.Model):
         """changes author's data and returns it, if author has more than one book, creates new author and returns him"""
         author = self.query.get(author_id)
         author_in_base_id = self.is_in_base(author_name=author_name, author_lastname=author_lastname)
-        if len(author.bibliographies) > 1 and any([
-            author.name != author_name,
-            author.lastname != author_lastname
-        ]):
+        if bool(author_in_base_id):
+            return self.query.get(author_in_base_id[0])
+        shared = more_than_one(db.session.query(bibliographies.c.book_id).filter(
+            bibliographies.c.author_id == author_id
+        ))
+        if shared:
             author = Author(name=author_name, lastname=author_lastname)
             db.session.add(author)
-            db.session.commit()
+            db.session.flush()
             return author
-        if bool(author_in_base_id):
-            return self.query.get(author_in_base_id)
         author.name = author_name
         author.lastname = author_lastname
-        db.session.commit()
+        db.session.flush()
+        CatalogView.refresh(book.id for book in author.bibliographies)
         return author
 
+    @serialized
     def delete(self, author_id: int) -> None:
         """removes the author"""
         author = self.query.get(author_id)
-        db.session.delete(author)
-        db.session.commit()
+        book_ids = [book_id for book_id, in db.session.query(bibliographies.c.book_id).filter(
+            bibliographies.c.author_id == author_id
+        )]
+        with unit_of_work(), FacetCount.tracking(*book_ids):
+            # drops the links in one statement, so the delete has no collection left to load and unlink
+            db.session.execute(bibliographies.delete().where(bibliographies.c.author_id == author_id))
+            db.session.delete(author)
+            Book.touch_many(book_ids)
+            CatalogView.refresh(book_ids)
+            CatalogVersion.bump()
 
     def __str__(self):
         return f"Author <{self.name} {self.lastname}, id: {self.id}>"
@@ -71,10 +241,40 @@ class Book(db.Model):
     rating = db.Column(db.Integer)
     description = db.Column(db.Text)
     borrowed_book_card_id = db.Column(db.Integer, db.ForeignKey('borrowed_book_card.id'))
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_book_rating_id', 'rating', 'id'),
+        db.Index('ix_book_genre_id_title', 'genre_id', 'title'),
+        db.Index('ix_book_genre_id_id', 'genre_id', 'id'),
+        db.Index('ix_book_publisher_id_title', 'publisher_id', 'title'),
+        db.Index('ix_book_borrowed_book_card_id', 'borrowed_book_card_id'),
+    )
 
     def __str__(self):
         return f"Book <title: {self.title}, id: {self.id}>"
 
+    def touch(self) -> None:
+        """bumps the version stamp of the book, done by every write that changes its page"""
+        self.version = (self.version or 0) + 1
+        self.updated_at = datetime.utcnow()
+
+    @staticmethod
+    def touch_many(book_ids: List[int]) -> None:
+        """bumps the version stamps of the books in one statement, for writes changing the rows of many books"""
+        if book_ids:
+            Book.query.filter(Book.id.in_(book_ids)).update(
+                {Book.version: func.coalesce(Book.version, 0) + 1, Book.updated_at: datetime.utcnow()},
+                synchronize_session=False
+            )
+
+    @staticmethod
+    def stamp(book_id: int) -> Optional[Tuple[int, datetime]]:
+        """returns the version and modification time of the book without loading it"""
+        return db.session.query(Book.version, Book.updated_at).filter(Book.id == book_id).first()
+
+    @read_only
     def is_title_in_base(self, title: str) -> int:
         t = self.query.filter_by(title=title).first()
         if t is not None:
@@ -87,12 +287,16 @@ class Book(db.Model):
         authors = [{'name': names.name.title(), 'lastname': names.lastname.title()} for names in author]
         return authors
 
+    @read_only
+    @cached('get_one')
     def get_one(self, book_id: int) -> object:
         """gets the details of the book"""
-        book = self.query.get(book_id)
+        book = self.query.options(
+            selectinload(Book.authors), joinedload(Book.genre), joinedload(Book.publish), joinedload(Book.lend)
+        ).get(book_id)
         author = book.get_authors(book.id)
-        genre = Genre.query.get(book.genre_id)
-        publisher = Publisher.query.get(book.publisher_id)
+        genre = book.genre
+        publisher = book.publish
         status = BorrowedBookCard().get_status(book_id)
         book = {
             'id': book.id,
@@ -105,31 +309,270 @@ class Book(db.Model):
             'description': book.description,
             'status': status
         }
-        print(author)
         return book
 
-    def get_all(self):
-        """downloads books from database and returns book list"""
-        books = []
-
-        for book in self.query.all():
-            authors = self.get_authors(book.id)
-            author = [f"{name['name']} {name['lastname']}" for name in authors]
-            authors = ', '.join(author)
-            genre = Genre.query.get(book.genre_id).genre
-            publisher = Publisher.query.get(book.publisher_id).name
-            status = BorrowedBookCard().get_status(book.id)
-            books.append({
-                'id': book.id,
-                'title': book.title,
-                'author': authors,
-                'genre': genre,
-                'publisher': publisher,
-                'rating': book.rating,
-                'description': book.description,
-                'status': status
-            })
-        return books
+    @staticmethod
+    def catalog_query():
+        """builds the catalog projection, read from catalog_view when CATALOG_VIEW is on"""
+        if CatalogView.enabled():
+            return CatalogView.catalog_query()
+        return Book.catalog_join_query()
+
+    @staticmethod
+    def catalog_columns() -> Dict[str, object]:
+        """the columns of the catalog projection the catalog is filtered and sorted by"""
+        if CatalogView.enabled():
+            return {
+                'id': CatalogView.book_id,
+                'title': CatalogView.title,
+                'author': CatalogView.author_lastname,
+                'genre': CatalogView.genre,
+                'publisher': CatalogView.publisher,
+                'rating': CatalogView.rating,
+                'borrowed': CatalogView.borrowed
+            }
+        return {
+            'id': Book.id,
+            'title': Book.title,
+            'author': None,
+            'genre': Genre.genre,
+            'publisher': Publisher.name,
+            'rating': Book.rating,
+            'borrowed': BorrowedBookCard.borrowed
+        }
+
+    @staticmethod
+    def catalog_join_query():
+        """builds the catalog projection from the tables: one row per book with genre, publisher
+        and card joined and the authors aggregated in a correlated subquery"""
+        return db.session.query(
+            Book.id,
+            Book.title,
+            Book.author_list().label('author'),
+            Genre.genre.label('genre'),
+            Publisher.name.label('publisher'),
+            Book.rating,
+            Book.description,
+            BorrowedBookCard.borrowed,
+            Book.version,
+            Book.updated_at
+        ).outerjoin(
+            Genre, Genre.id == Book.genre_id
+        ).outerjoin(
+            Publisher, Publisher.id == Book.publisher_id
+        ).outerjoin(
+            BorrowedBookCard, BorrowedBookCard.id == Book.borrowed_book_card_id
+        )
+
+    @staticmethod
+    def author_list():
+        """the authors of the book of the outer query as one 'name lastname, ...' string, ordered by lastname,
+        so the first author listed is the one the catalog sorts the book under (the lowest lastname)"""
+        authors = db.session.query(Author.name, Author.lastname).join(
+            bibliographies, bibliographies.c.author_id == Author.id
+        ).filter(
+            bibliographies.c.book_id == Book.id
+        ).order_by(Author.lastname, Author.name, Author.id).correlate(Book).subquery()
+        # group_concat keeps the order of an ordered subquery, which SQLite does not flatten into an aggregate
+        return db.session.query(func.group_concat(authors.c.name + ' ' + authors.c.lastname, ', ')).as_scalar()
+
+    @staticmethod
+    def author_subquery(aggregate):
+        """aggregates the authors of the book of the outer query"""
+        return db.session.query(aggregate).join(
+            bibliographies, bibliographies.c.author_id == Author.id
+        ).filter(
+            bibliographies.c.book_id == Book.id
+        ).correlate(Book).as_scalar()
+
+    @staticmethod
+    def catalog_row(row) -> Dict[str, Union[str, int]]:
+        """turns a row of the catalog projection into a book dictionary"""
+        return {
+            'id': row.id,
+            'title': row.title,
+            'author': (row.author or '').title(),
+            'genre': row.genre,
+            'publisher': row.publisher,
+            'rating': row.rating,
+            'description': row.description,
+            'status': BORROWED if row.borrowed is True else ON_SHELF,
+            'version': row.version,
+            'updated_at': row.updated_at.isoformat() if row.updated_at else None
+        }
+
+    @read_only
+    @cached('get_all')
+    def get_all(self) -> List[Dict[str, Union[str, int]]]:
+        """downloads books from database with a single query and returns book list"""
+        return [self.catalog_row(row) for row in self.catalog_query().order_by(self.catalog_columns()['id'])]
+
+    def iter_catalog(self, **filters) -> Iterator[Dict[str, Union[str, int]]]:
+        """yields the catalog book by book from a streamed cursor instead of building the whole list,
+        takes the same filters as filter_catalog"""
+        query = self.filter_catalog(self.catalog_query(), **filters).order_by(self.catalog_columns()['id'])
+        for row in query.execution_options(stream_results=True).yield_per(YIELD_PER):
+            yield self.catalog_row(row)
+
+    @staticmethod
+    def filter_catalog(query, genre: str = None, publisher: str = None, rating_min: int = None,
+                       rating_max: int = None, status: str = None):
+        """narrows the catalog projection down to the given genre, publisher, rating range and loan status"""
+        columns = Book.catalog_columns()
+        if genre is not None:
+            query = query.filter(columns['genre'] == genre)
+        if publisher is not None:
+            query = query.filter(columns['publisher'] == publisher)
+        if rating_min is not None:
+            query = query.filter(columns['rating'] >= rating_min)
+        if rating_max is not None:
+            query = query.filter(columns['rating'] <= rating_max)
+        if status == 'borrowed':
+            query = query.filter(columns['borrowed'].is_(True))
+        elif status == 'available':
+            query = query.filter(or_(columns['borrowed'].is_(None), columns['borrowed'].isnot(True)))
+        elif status is not None:
+            raise ValueError(f"unknown loan status: {status}")
+        return query
+
+    @cached('get_page')
+    def get_page(self, sort: str = 'title', after: str = None, limit: int = PAGE_SIZE,
+                 **filters) -> Tuple[List[Dict[str, Union[str, int]]], Optional[str]]:
+        """returns one page of the catalog and the cursor of the next one (None on the last page),
+        sort is one of SORT_KEYS, prefixed with '-' for descending order;
+        pages are cut with a (sort key, id) keyset so every page costs the same as the first one;
+        sorted by author, a book with several authors is listed once under each of them,
+        or once under the first of them when read from catalog_view;
+        without catalog_view the author sort joins the authors of every book and sorts them for each page,
+        it is only read from an index with CATALOG_VIEW on"""
+        descending = sort.startswith('-')
+        key = sort.lstrip('-')
+        if key not in SORT_KEYS:
+            raise ValueError(f"unknown sort key: {sort}")
+        query = self.filter_catalog(self.catalog_query(), **filters)
+        columns = self.catalog_columns()
+        column = columns[key]
+        if column is None:
+            link = aliased(bibliographies)
+            author = aliased(Author)
+            query = query.outerjoin(link, link.c.book_id == Book.id).outerjoin(author, author.id == link.c.author_id)
+            column = author.lastname
+        query = query.add_columns(column.label('sort_key'))
+        if descending:
+            query = query.order_by(column.desc(), columns['id'].desc())
+        else:
+            query = query.order_by(column, columns['id'])
+        ranges = [None]
+        if after is not None:
+            ranges = keyset_ranges(column, *decode_cursor(after), descending=descending, id_column=columns['id'])
+        rows = []
+        # the next range is read only when the page is not full yet, usually the first one fills it
+        for keyset in ranges:
+            page = query if keyset is None else query.filter(keyset)
+            rows += page.limit(limit + 1 - len(rows)).all()
+            if len(rows) > limit:
+                break
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].sort_key, rows[-1].id)
+        return [self.catalog_row(row) for row in rows], next_cursor
+
+    @cached('get_many')
+    def get_many(self, book_ids: Tuple[int, ...], fields: Tuple[str, ...] = API_FIELDS) -> List[Dict[str, object]]:
+        """gets the chosen fields of the books with one IN query per table the fields need,
+        in the order of book_ids; ids of missing books are left out"""
+        unknown = set(fields) - set(API_FIELDS)
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(sorted(unknown))}")
+        if not book_ids:
+            return []
+        rows = db.session.query(
+            Book.id, Book.title, Book.genre_id, Book.publisher_id, Book.rating, Book.description,
+            Book.borrowed_book_card_id, Book.version, Book.updated_at
+        ).filter(Book.id.in_(book_ids)).all()
+        authors = {}
+        if 'authors' in fields:
+            for book_id, name, lastname in db.session.query(
+                bibliographies.c.book_id, Author.name, Author.lastname
+            ).join(Author, Author.id == bibliographies.c.author_id).filter(
+                bibliographies.c.book_id.in_(book_ids)
+            ).order_by(bibliographies.c.book_id, Author.id):
+                authors.setdefault(book_id, []).append({'name': name.title(), 'lastname': lastname.title()})
+        genres = {}
+        if 'genre' in fields:
+            genre_ids = {row.genre_id for row in rows} - {None}
+            genres = dict(db.session.query(Genre.id, Genre.genre).filter(Genre.id.in_(genre_ids))) \
+                if genre_ids else {}
+        publishers = {}
+        if 'publisher' in fields:
+            publisher_ids = {row.publisher_id for row in rows} - {None}
+            publishers = dict(db.session.query(Publisher.id, Publisher.name).filter(Publisher.id.in_(publisher_ids))) \
+                if publisher_ids else {}
+        borrowed = {}
+        if 'status' in fields:
+            card_ids = {row.borrowed_book_card_id for row in rows} - {None}
+            borrowed = dict(db.session.query(BorrowedBookCard.id, BorrowedBookCard.borrowed).filter(
+                BorrowedBookCard.id.in_(card_ids)
+            )) if card_ids else {}
+        books = {}
+        for row in rows:
+            book = {
+                'id': row.id,
+                'title': row.title,
+                'authors': authors.get(row.id, []),
+                'genre': genres.get(row.genre_id),
+                'publisher': publishers.get(row.publisher_id),
+                'rating': row.rating,
+                'description': row.description,
+                'status': BORROWED if borrowed.get(row.borrowed_book_card_id) is True else ON_SHELF,
+                'version': row.version,
+                'updated_at': row.updated_at.isoformat() if row.updated_at else None
+            }
+            books[row.id] = {field: book[field] for field in fields}
+        return [books[book_id] for book_id in book_ids if book_id in books]
+
+    def get_ids(self, after: str = None, limit: int = PAGE_SIZE, **filters) -> Tuple[List[int], Optional[str]]:
+        """returns the ids of one page of books in id order and the cursor of the next page (None on the last one),
+        takes the same filters as filter_catalog"""
+        column = self.catalog_columns()['id']
+        query = self.filter_catalog(self.catalog_query(), **filters).with_entities(column)
+        if after is not None:
+            query = query.filter(column > decode_cursor(after)[1])
+        book_ids = [book_id for book_id, in query.order_by(column).limit(limit + 1)]
+        next_cursor = None
+        if len(book_ids) > limit:
+            book_ids = book_ids[:limit]
+            next_cursor = encode_cursor(None, book_ids[-1])
+        return book_ids, next_cursor
+
+    @cached('get_facets')
+    def get_facets(self, limit: int = FACET_LIMIT, **filters) -> Dict[str, List[Tuple[str, int]]]:
+        """the most common values of every facet in FACETS with the number of books having them,
+        narrowed by the same filters as filter_catalog; unfiltered counts come from FacetCount,
+        filtered ones from one GROUP BY per facet"""
+        if not filters:
+            return FacetCount.top(limit)
+        query = self.filter_catalog(self.catalog_query(), **filters)
+        columns = self.catalog_columns()
+        link = aliased(bibliographies)
+        author = aliased(Author)
+        values = {
+            'genre': (query, columns['genre']),
+            'publisher': (query, columns['publisher']),
+            'author': (query.join(link, link.c.book_id == columns['id']).join(author, author.id == link.c.author_id),
+                       author.name + ' ' + author.lastname),
+            'rating': (query, rating_bucket(columns['rating'])),
+            'status': (query, loan_status(columns['borrowed']))
+        }
+        facets = {}
+        for facet in FACETS:
+            facet_query, column = values[facet]
+            count = func.count().label('count')
+            facets[facet] = [tuple(row) for row in facet_query.with_entities(column, count).filter(
+                column.isnot(None)
+            ).group_by(column).order_by(count.desc(), column).limit(limit)]
+        return facets
 
     def add_title(self, title: str, rating: int, description: str) -> object:
         """adds a new title to the database and returns it,
@@ -142,64 +585,82 @@ class Book(db.Model):
                 description=description
             )
             db.session.add(book)
-            db.session.commit()
+            db.session.flush()
             return book
         return self.query.get(_id)
 
+    @serialized
     def add_book(self, details) -> None:
         """adds a new book to the database"""
-        book = self.add_title(
-            title=details['title'].title(),
-            rating=details['rating'],
-            description=details['description']
-        )
-        author = Author().add_author(
-            author_name=details['author_name'].title(),
-            author_lastname=details['author_lastname'].title()
-        )
-        book.authors.append(author)
-        genre = Genre().add_genre(genre=details['genre'].capitalize())
-        genre.books.append(book)
-        publisher = Publisher().add_publisher(publisher=details['publisher'].title())
-        publisher.books.append(book)
-        db.session.commit()
+        with unit_of_work(), FacetCount.tracking(self.is_title_in_base(details['title'].title())) as book_ids:
+            book = self.add_title(
+                title=details['title'].title(),
+                rating=details['rating'],
+                description=details['description']
+            )
+            book_ids.append(book.id)
+            author = Author().add_author(
+                author_name=details['author_name'].title(),
+                author_lastname=details['author_lastname'].title()
+            )
+            book.authors.append(author)
+            book.genre = Genre().add_genre(genre=details['genre'].capitalize())
+            book.publish = Publisher().add_publisher(publisher=details['publisher'].title())
+            book.touch()
+            CatalogView.refresh([book.id])
+            CatalogVersion.bump()
 
+    @serialized
     def update(self, book_id: int, details: Dict[str, Union[str, int]]) -> None:
-        book = self.query.get(book_id)
-        genre = Genre().update(book.genre_id, details['genre'].capitalize())
-        publisher = Publisher().update(book.publisher_id, details['publisher'].title())
-        author = Author().update(
-            book.authors[0].id,
-            details['author_name'].title(),
-            details['author_lastname'].title())
-        book.authors.clear()
-        book.authors.append(author)
-        book.publisher_id = publisher.id
-        book.genre_id = genre.id
-        book.title = details['title'].title()
-        book.rating = details['rating']
-        book.description = details['description']
-        db.session.commit()
+        with unit_of_work(), FacetCount.tracking(book_id):
+            book = self.query.get(book_id)
+            genre = Genre().update(book.genre_id, details['genre'].capitalize())
+            publisher = Publisher().update(book.publisher_id, details['publisher'].title())
+            author = Author().update(
+                book.authors[0].id,
+                details['author_name'].title(),
+                details['author_lastname'].title())
+            book.authors.clear()
+            book.authors.append(author)
+            book.publisher_id = publisher.id
+            book.genre_id = genre.id
+            book.title = details['title'].title()
+            book.rating = details['rating']
+            book.description = details['description']
+            book.touch()
+            CatalogView.refresh([book_id])
+            CatalogVersion.bump()
 
+    @serialized
     def delete(self, book_id: int) -> None:
-        """removes the book from the database"""
-        book = self.query.get(book_id)
-        db.session.delete(book)
-        db.session.commit()
+        """removes the book from the database, raises BookOnLoan while it is out;
+        its past loans stay in the ledger under the title of the book"""
+        with unit_of_work(), FacetCount.tracking(book_id):
+            book = self.query.get(book_id)
+            if db.session.query(Loan.id).filter(Loan.book_id == book_id, Loan.returned_at.is_(None)).first():
+                raise BookOnLoan(f"book {book_id} is on loan")
+            Loan.query.filter(Loan.book_id == book_id).update(
+                {Loan.book_id: None, Loan.title: book.title}, synchronize_session=False
+            )
+            db.session.delete(book)
+            CatalogView.remove(book_id)
+            CatalogVersion.bump()
 
 
 class Borrower(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(20), index=True)
     lastname = db.Column(db.String(30), index=True)
-    borrow = db.relationship("BorrowedBookCard", backref="borrow", lazy='subquery')
+    lookup_key = db.Column(db.String(60), index=True, unique=True, default=_person_key_default)
+    borrow = db.relationship("BorrowedBookCard", backref="borrow", lazy='select')
 
+    @read_only
     def is_in_base(self, borrower_name: str, borrower_lastname: str) -> List[int]:
-        """checks if the borrower is in the database and returns its id"""
-        borrower = self.query.filter_by(lastname=borrower_lastname).all()
-        if borrower is not None:
-            borrower_id = [name.id for name in borrower if name.name == borrower_name]
-            return borrower_id
+        """checks if the borrower is in the database with one lookup of the normalized key and returns its id"""
+        borrower = db.session.query(Borrower.id).filter(
+            Borrower.lookup_key == person_key(borrower_name, borrower_lastname)
+        ).first()
+        return [borrower.id] if borrower is not None else []
 
     def add_borrower(self, borrower_name: str, borrower_lastname: str) -> object:
         """adds borrower to database and returns it, if borrower is in database it returns existing one"""
@@ -207,9 +668,9 @@ class Borrower(db.Model):
         if not bool(_id):
             borrower = Borrower(name=borrower_name.title(), lastname=borrower_lastname.title())
             db.session.add(borrower)
-            db.session.commit()
+            db.session.flush()
             return borrower
-        return self.query.get(_id)
+        return self.query.get(_id[0])
 
     def __str__(self):
         return f"Borrower <{self.name} {self.lastname}>"
@@ -223,8 +684,9 @@ class BorrowedBookCard(db.Model):
     date_of_borrow = db.Column(db.Date)
     date_of_return = db.Column(db.Date)
     borrowed = db.Column(db.Boolean)
-    lend = db.relationship("Book", backref="lend", lazy='subquery')
+    lend = db.relationship("Book", backref="lend", lazy='select')
 
+    @read_only
     def is_in_base(self, book_id: int) -> int:
         """checks if the card is in the database and returns the card id"""
         card = self.query.filter_by(book_id=book_id).first()
@@ -237,28 +699,42 @@ class BorrowedBookCard(db.Model):
         if _id is None:
             card = BorrowedBookCard(borrowed=False)
             db.session.add(card)
-            db.session.commit()
+            db.session.flush()
             return card
         return self.query.get(_id)
 
+    @serialized
     def borrow_book(self, book_id: int, borrower_name: str, borrower_lastname: str) -> None:
         """sets borrowed to True"""
-        book = Book().query.get(book_id)
-        card = self.add_card(book_id)
-        borrower = Borrower().add_borrower(borrower_name, borrower_lastname)
-        borrower.borrow.append(card)
-        card.book_id = book_id
-        book.borrowed_book_card_id = card.id
-        card.borrowed = True
-        db.session.commit()
+        with unit_of_work(), FacetCount.tracking(book_id):
+            book = Book().query.get(book_id)
+            card = self.add_card(book_id)
+            borrower = Borrower().add_borrower(borrower_name, borrower_lastname)
+            card.borrow = borrower
+            card.book_id = book_id
+            book.borrowed_book_card_id = card.id
+            card.borrowed = True
+            card.date_of_loan = date.today()
+            card.date_of_return = None
+            Loan().open(book_id, borrower)
+            book.touch()
+            CatalogView.refresh([book_id])
+            CatalogVersion.bump()
 
+    @serialized
     def give_back_book(self, book_id: int) -> None:
         """sets borrowed to False"""
-        card = self.add_card(book_id)
-        card.borrowed = False
-        card.borrower_id = None
-        db.session.commit()
+        with unit_of_work(), FacetCount.tracking(book_id):
+            card = self.add_card(book_id)
+            card.borrowed = False
+            card.borrower_id = None
+            card.date_of_return = date.today()
+            Loan().close(book_id)
+            Book.query.get(book_id).touch()
+            CatalogView.refresh([book_id])
+            CatalogVersion.bump()
 
+    @read_only
     def get_status(self, book_id: int) -> str:
         """checks if the book is on loan and returns its status"""
         book = Book().query.get(book_id)
@@ -266,18 +742,94 @@ class BorrowedBookCard(db.Model):
         if card_id:
             card = self.query.get(card_id)
             if card.borrowed is True:
-                return 'pożyczona'
-        return 'na półce'
+                return BORROWED
+        return ON_SHELF
 
     def __str__(self):
         return f"Borrow <{self.borrowed}>"
 
 
+class Loan(db.Model):
+    """append-only ledger of loans, a row is opened by borrow_book and closed by give_back_book;
+    the loans of a deleted book lose their book_id and keep its title"""
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('book.id'))
+    title = db.Column(db.String(100))
+    borrower_id = db.Column(db.Integer, db.ForeignKey('borrower.id'), nullable=False)
+    loaned_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    due_at = db.Column(db.Date, nullable=False)
+    returned_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_loan_open_book_id', 'book_id', unique=True, sqlite_where=db.text('returned_at IS NULL')),
+        db.Index('ix_loan_open_due_at', 'due_at', sqlite_where=db.text('returned_at IS NULL')),
+        db.Index('ix_loan_borrower_id_loaned_at', 'borrower_id', 'loaned_at'),
+        db.Index('ix_loan_returned_at', 'returned_at', sqlite_where=db.text('returned_at IS NOT NULL')),
+    )
+
+    def open(self, book_id: int, borrower: Borrower) -> object:
+        """closes the open loan of the book, if any, and opens a new one for the borrower"""
+        self.close(book_id)
+        now = datetime.utcnow()
+        loan = Loan(
+            book_id=book_id,
+            borrower_id=borrower.id,
+            loaned_at=now,
+            due_at=now.date() + timedelta(days=current_app.config.get('LOAN_PERIOD_DAYS', 30))
+        )
+        db.session.add(loan)
+        return loan
+
+    def close(self, book_id: int) -> None:
+        """marks the open loan of the book as returned"""
+        self.query.filter(Loan.book_id == book_id, Loan.returned_at.is_(None)).update(
+            {Loan.returned_at: datetime.utcnow()}, synchronize_session=False
+        )
+
+    @staticmethod
+    def listing_query():
+        return db.session.query(
+            Loan.id,
+            Loan.book_id,
+            func.coalesce(Book.title, Loan.title).label('title'),
+            Loan.borrower_id,
+            Borrower.name,
+            Borrower.lastname,
+            Loan.loaned_at,
+            Loan.due_at,
+            Loan.returned_at
+        ).outerjoin(Book, Book.id == Loan.book_id).join(Borrower, Borrower.id == Loan.borrower_id)
+
+    def current(self) -> List[Dict[str, object]]:
+        """returns the books on loan right now, the soonest due first"""
+        query = self.listing_query().filter(Loan.returned_at.is_(None)).order_by(Loan.due_at, Loan.id)
+        return [row._asdict() for row in query]
+
+    def overdue(self, today: date = None) -> List[Dict[str, object]]:
+        """returns the open loans past their due date, the longest overdue first"""
+        today = today or date.today()
+        query = self.listing_query().filter(
+            Loan.returned_at.is_(None), Loan.due_at < today
+        ).order_by(Loan.due_at, Loan.id)
+        return [row._asdict() for row in query]
+
+    def history(self, borrower_id: int) -> List[Dict[str, object]]:
+        """returns every loan of the borrower, the latest first"""
+        query = self.listing_query().filter(Loan.borrower_id == borrower_id).order_by(
+            Loan.loaned_at.desc(), Loan.id.desc()
+        )
+        return [row._asdict() for row in query]
+
+    def __str__(self):
+        return f"Loan <book: {self.book_id}, borrower: {self.borrower_id}, returned: {self.returned_at}>"
+
+
 class Publisher(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), index=True, unique=True)
-    books = db.relationship("Book", backref="publish", lazy='subquery')
+    books = db.relationship("Book", backref="publish", lazy='select')
 
+    @read_only
     def is_in_base(self, publisher_name: str) -> int:
         """checks if the publisher is in the database and returns its id"""
         publisher = self.query.filter_by(name=publisher_name).first()
@@ -291,30 +843,41 @@ class Publisher(db.Model):
         if _id is None:
             publisher = Publisher(name=publisher)
             db.session.add(publisher)
-            db.session.commit()
+            db.session.flush()
             return publisher
         return self.query.get(_id)
 
+    @serialized
     def delete(self, publisher_id: int) -> None:
         """removes the publisher from the database"""
         publisher = self.query.get(publisher_id)
-        db.session.delete(publisher)
-        db.session.commit()
+        book_ids = [book_id for book_id, in db.session.query(Book.id).filter(Book.publisher_id == publisher_id)]
+        with unit_of_work(), FacetCount.tracking(*book_ids):
+            # unlinked in one statement, so the delete finds no books to load and unlink one by one
+            Book.query.filter(Book.publisher_id == publisher_id).update(
+                {Book.publisher_id: None}, synchronize_session=False
+            )
+            db.session.delete(publisher)
+            Book.touch_many(book_ids)
+            CatalogView.refresh(book_ids)
+            CatalogVersion.bump()
 
     def update(self, publisher_id: int, name: str) -> object:
         """changes the publisher's data and returns the publisher,
         if the publisher has more than one book, add a new publisher to the database and return it"""
         publisher = self.query.get(publisher_id)
         publisher_in_base_id = self.is_in_base(publisher_name=name)
-        if len(publisher.books) > 1 and publisher.name != name:
+        if bool(publisher_in_base_id):
+            return self.query.get(publisher_in_base_id)
+        shared = more_than_one(db.session.query(Book.id).filter(Book.publisher_id == publisher_id))
+        if shared:
             publisher = Publisher(name=name)
             db.session.add(publisher)
-            db.session.commit()
+            db.session.flush()
             return publisher
-        if bool(publisher_in_base_id):
-            return self.query.get(publisher_in_base_id)
         publisher.name = name
-        db.session.commit()
+        db.session.flush()
+        CatalogView.refresh(book.id for book in publisher.books)
         return publisher
 
     def __str__(self):
@@ -324,8 +887,9 @@ class Publisher(db.Model):
 class Genre(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     genre = db.Column(db.String(50), index=True, unique=True)
-    books = db.relationship("Book", backref="genre", lazy='subquery')
+    books = db.relationship("Book", backref="genre", lazy='select')
 
+    @read_only
     def is_in_base(self, genre_name: str) -> int:
         """checks if genre is in the database and returns the genre id"""
         genre = self.query.filter_by(genre=genre_name).first()
@@ -338,30 +902,279 @@ class Genre(db.Model):
         if _id is None:
             genre = Genre(genre=genre)
             db.session.add(genre)
-            db.session.commit()
+            db.session.flush()
             return genre
         return self.query.get(_id)
 
+    @serialized
     def delete(self, genre_id: int) -> None:
         """removes genre from the database"""
         genre = self.query.get(genre_id)
-        db.session.delete(genre)
-        db.session.commit()
+        book_ids = [book_id for book_id, in db.session.query(Book.id).filter(Book.genre_id == genre_id)]
+        with unit_of_work(), FacetCount.tracking(*book_ids):
+            Book.query.filter(Book.genre_id == genre_id).update({Book.genre_id: None}, synchronize_session=False)
+            db.session.delete(genre)
+            Book.touch_many(book_ids)
+            CatalogView.refresh(book_ids)
+            CatalogVersion.bump()
 
     def update(self, genre_id: int, name: str):
         """renames genre and returns them, if there are more books in the genre, creates new ones and returns them"""
         genre = self.query.get(genre_id)
         genre_is_in_base_id = self.is_in_base(genre_name=name)
-        if len(genre.books) > 1 and genre.genre != name:
+        if bool(genre_is_in_base_id):
+            return self.query.get(genre_is_in_base_id)
+        shared = more_than_one(db.session.query(Book.id).filter(Book.genre_id == genre_id))
+        if shared:
             genre = Genre(genre=name)
             db.session.add(genre)
-            db.session.commit()
+            db.session.flush()
             return genre
-        if bool(genre_is_in_base_id):
-            return self.query.get(genre_is_in_base_id)
         genre.genre = name
-        db.session.commit()
+        db.session.flush()
+        CatalogView.refresh(book.id for book in genre.books)
         return genre
 
     def __str__(self):
         return f"Genre <{self.genre}, id: {self.id}>"
+
+
+class CatalogView(db.Model):
+    """flat copy of the catalog projection, one row per book, rewritten in the transaction of every write
+    that changes what the book's catalog row shows; catalog reads use it when CATALOG_VIEW is on"""
+    __tablename__ = 'catalog_view'
+    book_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    title = db.Column(db.String(100))
+    author = db.Column(db.Text)
+    author_lastname = db.Column(db.String(30))
+    genre = db.Column(db.String(50))
+    publisher = db.Column(db.String(50))
+    rating = db.Column(db.Integer)
+    description = db.Column(db.Text)
+    borrowed = db.Column(db.Boolean, nullable=False, default=False)
+    version = db.Column(db.Integer)
+    updated_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_catalog_view_title_book_id', 'title', 'book_id'),
+        db.Index('ix_catalog_view_author_lastname_book_id', 'author_lastname', 'book_id'),
+        db.Index('ix_catalog_view_rating_book_id', 'rating', 'book_id'),
+        db.Index('ix_catalog_view_genre_title', 'genre', 'title'),
+        db.Index('ix_catalog_view_genre_book_id', 'genre', 'book_id'),
+        db.Index('ix_catalog_view_publisher_title', 'publisher', 'title'),
+        db.Index('ix_catalog_view_publisher_book_id', 'publisher', 'book_id'),
+    )
+
+    _refresh_statement = None
+    _compiled_cache = {}
+
+    @staticmethod
+    def enabled() -> bool:
+        return current_app.config.get('CATALOG_VIEW', False)
+
+    @classmethod
+    def catalog_query(cls):
+        """reads the catalog projection from the single table"""
+        return db.session.query(
+            cls.book_id.label('id'),
+            cls.title,
+            cls.author,
+            cls.genre,
+            cls.publisher,
+            cls.rating,
+            cls.description,
+            cls.borrowed,
+            cls.version,
+            cls.updated_at
+        )
+
+    @classmethod
+    def source_query(cls):
+        """the rows of the view computed from the tables, in column order"""
+        return Book.catalog_join_query().with_entities(
+            Book.id,
+            Book.title,
+            Book.author_list(),
+            Book.author_subquery(func.min(Author.lastname)),
+            Genre.genre,
+            Publisher.name,
+            Book.rating,
+            Book.description,
+            func.coalesce(BorrowedBookCard.borrowed, False),
+            Book.version,
+            Book.updated_at
+        )
+
+    @classmethod
+    def write_statement(cls, query):
+        """INSERT OR REPLACE of the rows the query computes"""
+        columns = [column.name for column in cls.__table__.columns]
+        return cls.__table__.insert().prefix_with('OR REPLACE').from_select(columns, query.statement)
+
+    @classmethod
+    def refresh(cls, book_ids: Iterable[int]) -> None:
+        """brings the rows of the books up to date in the current transaction; the statement is built
+        and compiled once, so a refresh costs about as much as running it"""
+        book_ids = list(book_ids)
+        if not cls.enabled() or not book_ids:
+            return
+        if cls._refresh_statement is None:
+            cls._refresh_statement = cls.write_statement(
+                cls.source_query().filter(Book.id.in_(bindparam('book_ids', expanding=True)))
+            )
+        db.session.flush()
+        db.session.connection().execution_options(compiled_cache=cls._compiled_cache).execute(
+            cls._refresh_statement, book_ids=book_ids
+        )
+
+    @classmethod
+    def remove(cls, book_id: int) -> None:
+        """drops the row of a deleted book in the current transaction"""
+        if cls.enabled():
+            cls.query.filter(cls.book_id == book_id).delete(synchronize_session=False)
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """fills the view from scratch in one transaction and returns the number of rows"""
+        with unit_of_work():
+            cls.query.delete(synchronize_session=False)
+            db.session.execute(cls.write_statement(cls.source_query()))
+        return cls.query.count()
+
+    def __str__(self):
+        return f"CatalogView <{self.title}, book: {self.book_id}>"
+
+
+class FacetCount(db.Model):
+    """number of books per value of every facet in FACETS over the whole catalog, adjusted by the write
+    methods by the difference of the facets of the books they change, so the unfiltered facets are
+    read without counting the books"""
+    facet = db.Column(db.String(20), primary_key=True)
+    value = db.Column(db.String(101), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_facet_count_facet_count', 'facet', 'count'),
+    )
+
+    _facets_statement = None
+    _compiled_cache = {}
+
+    @staticmethod
+    def facet_queries(book_ids=None) -> list:
+        """one (facet, value) select per facet over the tables, one row per book and value"""
+        queries = [
+            select([literal('genre'), Genre.genre]).select_from(
+                Book.__table__.join(Genre.__table__, Genre.id == Book.genre_id)),
+            select([literal('publisher'), Publisher.name]).select_from(
+                Book.__table__.join(Publisher.__table__, Publisher.id == Book.publisher_id)),
+            select([literal('author'), Author.name + ' ' + Author.lastname]).select_from(
+                Book.__table__.join(bibliographies, bibliographies.c.book_id == Book.id).join(
+                    Author.__table__, Author.id == bibliographies.c.author_id)),
+            select([literal('rating'), rating_bucket(Book.rating)]),
+            select([literal('status'), loan_status(BorrowedBookCard.borrowed)]).select_from(
+                Book.__table__.outerjoin(BorrowedBookCard.__table__, BorrowedBookCard.id == Book.borrowed_book_card_id))
+        ]
+        if book_ids is not None:
+            queries = [query.where(Book.id.in_(book_ids)) for query in queries]
+        return queries
+
+    @classmethod
+    def book_facets(cls, book_ids: List[int]) -> Counter:
+        """counts the (facet, value) pairs of the books with one statement compiled once"""
+        if not book_ids:
+            return Counter()
+        if cls._facets_statement is None:
+            cls._facets_statement = union_all(*cls.facet_queries(bindparam('book_ids', expanding=True)))
+        db.session.flush()
+        rows = db.session.connection().execution_options(compiled_cache=cls._compiled_cache).execute(
+            cls._facets_statement, book_ids=book_ids
+        )
+        return Counter((facet, value) for facet, value in rows if value is not None)
+
+    @classmethod
+    def adjust(cls, before: Counter, after: Counter) -> None:
+        """adds the difference between the facets after and before a write to the counts"""
+        changes = [
+            {'facet': facet, 'value': value, 'change': after[(facet, value)] - before[(facet, value)]}
+            for facet, value in set(before) | set(after) if after[(facet, value)] != before[(facet, value)]
+        ]
+        if changes:
+            db.session.execute(text(
+                "INSERT INTO facet_count (facet, value, count) VALUES (:facet, :value, :change) "
+                "ON CONFLICT (facet, value) DO UPDATE SET count = count + excluded.count"
+            ), changes)
+
+    @classmethod
+    @contextmanager
+    def tracking(cls, *book_ids: Optional[int]) -> Iterator[List[int]]:
+        """adjusts the counts by the change the block makes to the facets of the books;
+        ids of books the block creates are appended to the yielded list"""
+        book_ids = [book_id for book_id in book_ids if book_id is not None]
+        before = cls.book_facets(book_ids)
+        yield book_ids
+        cls.adjust(before, cls.book_facets(book_ids))
+
+    @classmethod
+    def rebuild(cls) -> int:
+        """counts every facet from scratch in one transaction and returns the number of rows"""
+        with unit_of_work():
+            cls.query.delete(synchronize_session=False)
+            pairs = union_all(*cls.facet_queries()).alias('pairs')
+            facet, value = pairs.c
+            db.session.execute(cls.__table__.insert().from_select(
+                ['facet', 'value', 'count'],
+                select([facet, value, func.count()]).where(value.isnot(None)).group_by(facet, value)
+            ))
+        return cls.query.count()
+
+    @classmethod
+    def top(cls, limit: int = FACET_LIMIT) -> Dict[str, List[Tuple[str, int]]]:
+        """the most common values of every facet with their counts, read from the table"""
+        return {
+            facet: [(value, count) for value, count in db.session.query(cls.value, cls.count).filter(
+                cls.facet == facet, cls.count > 0
+            ).order_by(cls.count.desc(), cls.value).limit(limit)]
+            for facet in FACETS
+        }
+
+    def __str__(self):
+        return f"FacetCount <{self.facet}: {self.value}, {self.count}>"
+
+
+class CatalogVersion(db.Model):
+    """single-row counter bumped by every write that changes what the catalog shows,
+    cached reads are keyed by it"""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    @classmethod
+    def current(cls) -> int:
+        """returns the current catalog version"""
+        version = db.session.query(cls.version).filter(cls.id == 1).scalar()
+        return version or 0
+
+    @classmethod
+    def stamp(cls) -> Optional[Tuple[int, datetime]]:
+        """returns the catalog version and the time of the last catalog change"""
+        return db.session.query(cls.version, cls.updated_at).filter(cls.id == 1).first()
+
+    @classmethod
+    def bump(cls) -> None:
+        """increments the catalog version in the current transaction"""
+        updated = cls.query.filter(cls.id == 1).update(
+            {cls.version: cls.version + 1, cls.updated_at: datetime.utcnow()}, synchronize_session=False
+        )
+        if not updated:
+            db.session.add(cls(id=1, version=1, updated_at=datetime.utcnow()))
+
+    def __str__(self):
+        return f"CatalogVersion <{self.version}, updated: {self.updated_at}>"
+
+
+@event.listens_for(Author, 'before_update')
+@event.listens_for(Borrower, 'before_update')
+def _update_person_key(mapper, connection, target) -> None:
+    """keeps the lookup key in step with renames"""
+    target.lookup_key = person_key(target.name, target.lastname)
@@ -0,0 +1,386 @@
+# app/routes.py
+
+from flask import Blueprint, Markup, Response, current_app, request, render_template, redirect, url_for, abort, \
+    stream_with_context, jsonify, make_response, session
+from app.autocomplete import autocomplete, KINDS as AUTOCOMPLETE_KINDS
+from app.cache import cache, compressed, fragments
+from app.models import Book, BookOnLoan, Borrower, BorrowedBookCard, CatalogVersion, Loan, PAGE_SIZE, LOAN_STATUSES, \
+    API_FIELDS, FACET_LIMIT, NO_RATING, reading
+from app.forms import BookForm, Borrow
+from app.exporter import export_books as export_book_rows, FORMATS, MIMETYPES
+from app.search import search_books
+from app.writer import WriteQueueFull, WriteTimeout, writer
+from app.maintenance import scheduler
+from functools import wraps
+import hashlib
+import json
+import time
+
+library_bp = Blueprint('library', __name__)
+api_bp = Blueprint('api', __name__, url_prefix='/api')
+
+MAX_PAGE_SIZE = 500
+STREAM_BUFFER = 50
+# used when CSRF tokens do not expire (WTF_CSRF_TIME_LIMIT = None)
+ETAG_WINDOW = 1800
+
+
+def etag_window() -> int:
+    """seconds an ETag stays the same; pages embed a CSRF token, so a copy revalidated with 304 near the end
+    of the window still carries a token with at least half of WTF_CSRF_TIME_LIMIT left"""
+    limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    return max(1, limit // 2) if limit else ETAG_WINDOW
+
+
+def conditional(stamp):
+    """answers If-None-Match / If-Modified-Since with 304 using only the version stamp
+    returned by stamp(**view_args), before the view and its queries run"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            found = stamp(**kwargs)
+            if found is None:
+                return view(**kwargs)
+            version, updated_at = found
+
+            def etag():
+                token = session.get('csrf_token', '')
+                window = int(time.time() // etag_window())
+                return hashlib.sha1(f"{version}:{request.full_path}:{token}:{window}".encode()).hexdigest()
+
+            last_modified = updated_at.replace(microsecond=0) if updated_at else None
+            if request.if_none_match:
+                fresh = request.if_none_match.contains_weak(etag())
+            else:
+                since = request.if_modified_since
+                fresh = None not in (since, last_modified) and last_modified <= since.replace(tzinfo=None)
+            response = Response(status=304) if fresh else make_response(view(**kwargs))
+            response.set_etag(etag())
+            response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            response.cache_control.private = True
+            return response
+        return wrapper
+    return decorator
+
+
+def read_only_view(view):
+    """serves the view, and the body it streams, from the read-only connections;
+    only for views that never write, /giveback/ is a GET that does"""
+    @wraps(view)
+    def wrapper(**kwargs):
+        with reading():
+            response = view(**kwargs)
+        if isinstance(response, Response) and response.is_streamed:
+            response.response = read_through(response.response)
+        return response
+    return wrapper
+
+
+def read_through(body):
+    with reading():
+        yield from body
+
+
+def catalog_filters() -> dict:
+    """reads the filters of the catalog from the query string"""
+    filters = {
+        'genre': request.args.get('genre') or None,
+        'publisher': request.args.get('publisher') or None,
+        'rating_min': request.args.get('rating_min', type=int),
+        'rating_max': request.args.get('rating_max', type=int),
+        'status': request.args.get('status') or None
+    }
+    if filters['status'] is not None and filters['status'] not in LOAN_STATUSES:
+        abort(400)
+    return {key: value for key, value in filters.items() if value is not None}
+
+
+def catalog_args() -> dict:
+    """reads the sorting, filtering and paging parameters of the catalog from the query string"""
+    args = catalog_filters()
+    args['sort'] = request.args.get('sort', 'title')
+    args['limit'] = max(1, min(request.args.get('limit', PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    return args
+
+
+def api_fields() -> tuple:
+    """reads the comma separated ?fields= list, all fields when it is missing"""
+    fields = tuple(field.strip() for field in request.args.get('fields', '').split(',') if field.strip())
+    if any(field not in API_FIELDS for field in fields):
+        abort(400)
+    return fields or API_FIELDS
+
+
+def api_ids() -> tuple:
+    """reads the comma separated ?ids= list, at most MAX_PAGE_SIZE distinct ids in the given order"""
+    try:
+        book_ids = tuple(dict.fromkeys(int(book_id) for book_id in request.args['ids'].split(',') if book_id.strip()))
+    except ValueError:
+        abort(400)
+    if len(book_ids) > MAX_PAGE_SIZE:
+        abort(400)
+    return book_ids
+
+
+def stream_template(template_name: str, **context):
+    """renders the template piece by piece instead of building the whole page in memory"""
+    current_app.update_template_context(context)
+    stream = current_app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(STREAM_BUFFER)
+    return stream
+
+
+def stream_json(books):
+    """serializes the books as a JSON array one book at a time"""
+    yield '['
+    for number, book in enumerate(books):
+        yield (',' if number else '') + json.dumps(book, ensure_ascii=False)
+    yield ']'
+
+
+def facet_filter(facet: str, value: str) -> dict:
+    """the catalog filters selecting the books with the facet value, None when there are none"""
+    if facet in ('genre', 'publisher', 'status'):
+        return {facet: value}
+    if facet == 'rating' and value != NO_RATING:
+        rating_min, rating_max = value.split('-')
+        return {'rating_min': rating_min, 'rating_max': rating_max}
+
+
+def facet_links(facets: dict, args: dict) -> dict:
+    """adds to every facet value the url of the catalog narrowed down to it, authors link to the search"""
+    links = {}
+    for facet, values in facets.items():
+        links[facet] = []
+        for value, count in values:
+            if facet == 'author':
+                url = url_for('library.library_search', q=value)
+            else:
+                narrowed = facet_filter(facet, value)
+                url = url_for('library.library', **dict(args, **narrowed)) if narrowed is not None else None
+            links[facet].append((value, count, url))
+    return links
+
+
+@library_bp.app_template_global()
+def book_row(book: dict) -> Markup:
+    """the <tr> of a catalog book, rendered again only when the version stamp of the book changes"""
+    key = ('book_row', book['id'], book['version'], book['updated_at'])
+    return Markup(fragments.get_or_render(
+        key, lambda: current_app.jinja_env.get_template('_book_row.html').render(book=book)
+    ))
+
+
+def render_library(form, error=''):
+    args = catalog_args()
+    try:
+        books, next_cursor = Book().get_page(after=request.args.get('after'), **args)
+    except ValueError:
+        abort(400)
+    facets = facet_links(Book().get_facets(**catalog_filters()), args)
+    return render_template('library.html', form=form, books=books, args=args, next_cursor=next_cursor, error=error,
+                           facets=facets)
+
+
+@library_bp.app_errorhandler(WriteQueueFull)
+def write_queue_full(error):
+    response = make_response("zbyt wiele zapisów naraz, spróbuj ponownie za chwilę", 503)
+    response.retry_after = 1
+    return response
+
+
+@library_bp.app_errorhandler(WriteTimeout)
+def write_timeout(error):
+    # the write is still queued and may yet be committed, so nothing here invites sending it again
+    return make_response("zapis trwa dłużej niż zwykle i mógł się udać, sprawdź katalog przed ponowieniem", 504)
+
+
+@library_bp.route("/library/", methods=['GET'])
+@read_only_view
+@conditional(lambda: CatalogVersion.stamp())
+def library():
+    form = BookForm()
+    return render_library(form)
+
+
+@library_bp.route("/library/stream/", methods=['GET'])
+@read_only_view
+def library_stream():
+    filters = catalog_filters()
+    books = Book().iter_catalog(**filters)
+    if request.args.get('format') == 'json':
+        return Response(stream_with_context(stream_json(books)), mimetype='application/json')
+    form = BookForm()
+    page = stream_template('library.html', form=form, books=books, args=filters, next_cursor=None)
+    return Response(stream_with_context(page), mimetype='text/html')
+
+
+@library_bp.route("/library/export", methods=['GET'])
+@read_only_view
+def library_export():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        abort(400)
+    gzip = request.args.get('gzip', type=int) == 1
+    books = Book().iter_catalog(**catalog_filters())
+    filename = f"library.{fmt}" + (".gz" if gzip else "")
+    response = Response(stream_with_context(export_book_rows(books, fmt, gzip=gzip)),
+                        mimetype='application/gzip' if gzip else MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@library_bp.route("/library/search/", methods=['GET'])
+@read_only_view
+def library_search():
+    query = request.args.get('q', '')
+    page = max(1, request.args.get('page', 1, type=int))
+    books, has_next = search_books(query, page=page)
+    return render_template('search.html', query=query, books=books, page=page, has_next=has_next)
+
+
+@library_bp.route("/library/cache/", methods=['GET'])
+def cache_stats():
+    return jsonify(dict(cache.stats(), fragments=fragments.stats(), compressed=compressed.stats()))
+
+
+@library_bp.route("/library/writes/", methods=['GET'])
+def write_stats():
+    return jsonify(writer.stats())
+
+
+@library_bp.route("/library/maintenance/", methods=['GET'])
+def maintenance_stats():
+    return jsonify(scheduler.stats())
+
+
+@library_bp.route("/library/", methods=['POST'])
+def add_new_book():
+    form = BookForm()
+    error = ''
+    if form.validate_on_submit():
+        details = form.data
+        if bool(Book().is_title_in_base(details['title'])) is True:
+            error = "książka już istnieje w bazie danych"
+            return render_library(form, error=error)
+        Book().add_book(details)
+        return redirect(url_for('library.library'))
+    if 'csrf_token' in form.errors:
+        error = "formularz wygasł, wyślij go ponownie"
+    return render_library(form, error=error)
+
+
+@library_bp.route("/library/<int:book_id>/", methods=['GET'])
+@read_only_view
+@conditional(Book.stamp)
+def book_details(book_id):
+    book = Book().get_one(book_id)
+    form = BookForm(data=book)
+    return render_template('book.html', form=form, book_id=book_id, book=book)
+
+
+@library_bp.route("/library/<int:book_id>/", methods=['POST'])
+def book_update(book_id):
+    book = Book().get_one(book_id)
+    form = BookForm(data=book)
+    error = ''
+    if form.validate_on_submit():
+        Book().update(book_id, form.data)
+        return redirect(url_for("library.library"))
+    return render_template('book.html', form=form, book_id=book_id)
+
+
+@library_bp.route("/delete/<int:book_id>/", methods=['POST'])
+def delete_book(book_id):
+    try:
+        Book().delete(book_id)
+    except BookOnLoan:
+        abort(409, "książka jest wypożyczona, przyjmij jej zwrot przed usunięciem")
+    return redirect(url_for('library.library'))
+
+
+@library_bp.route("/library/lend/<int:book_id>/", methods=['GET'])
+def lend(book_id):
+    form = Borrow()
+    return render_template('lend.html', form=form, book_id=book_id)
+
+
+@library_bp.route("/borrow/<int:book_id>/", methods=['POST'])
+def borrow(book_id):
+    form = Borrow()
+    data = form.data
+    if form.validate_on_submit():
+        BorrowedBookCard().borrow_book(book_id, data['borrower_name'], data['borrower_lastname'])
+        return redirect(url_for('library.book_details', book_id=book_id))
+    return redirect(url_for('library.book_details', book_id=book_id))
+
+
+@library_bp.route("/giveback/<int:book_id>/", methods=['GET'])
+def give_back(book_id):
+    BorrowedBookCard().give_back_book(book_id)
+    return redirect(url_for('library.book_details', book_id=book_id))
+
+
+@library_bp.route("/loans/", methods=['GET'])
+@read_only_view
+def loans():
+    return render_template('loans.html', heading="Wypożyczone książki", loans=Loan().current())
+
+
+@library_bp.route("/loans/overdue/", methods=['GET'])
+@read_only_view
+def overdue_loans():
+    return render_template('loans.html', heading="Przetrzymane książki", loans=Loan().overdue())
+
+
+@library_bp.route("/borrowers/<int:borrower_id>/loans/", methods=['GET'])
+@read_only_view
+def borrower_loans(borrower_id):
+    borrower = Borrower.query.get_or_404(borrower_id)
+    heading = f"Historia wypożyczeń: {borrower.name} {borrower.lastname}"
+    return render_template('loans.html', heading=heading, loans=Loan().history(borrower_id))
+
+
+@api_bp.route("/books/", methods=['GET'])
+@read_only_view
+@conditional(lambda: CatalogVersion.stamp())
+def books():
+    fields = api_fields()
+    if 'ids' in request.args:
+        return jsonify(books=Book().get_many(api_ids(), fields), next=None)
+    limit = max(1, min(request.args.get('limit', PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    try:
+        book_ids, next_cursor = Book().get_ids(after=request.args.get('after'), limit=limit, **catalog_filters())
+    except ValueError:
+        abort(400)
+    return jsonify(books=Book().get_many(tuple(book_ids), fields), next=next_cursor)
+
+
+@api_bp.route("/facets/", methods=['GET'])
+@read_only_view
+@conditional(lambda: CatalogVersion.stamp())
+def facets():
+    limit = max(1, min(request.args.get('limit', FACET_LIMIT, type=int), MAX_PAGE_SIZE))
+    facets = Book().get_facets(limit=limit, **catalog_filters())
+    return jsonify({facet: [{'value': value, 'count': count} for value, count in values]
+                    for facet, values in facets.items()})
+
+
+@api_bp.route("/books/<int:book_id>/", methods=['GET'])
+@read_only_view
+@conditional(Book.stamp)
+def book(book_id):
+    books = Book().get_many((book_id,), api_fields())
+    if not books:
+        abort(404)
+    return jsonify(books[0])
+
+
+@api_bp.route("/autocomplete/<kind>/", methods=['GET'])
+@read_only_view
+def suggestions(kind):
+    if kind not in AUTOCOMPLETE_KINDS:
+        abort(404)
+    limit = max(1, min(request.args.get('limit', autocomplete.limit, type=int), MAX_PAGE_SIZE))
+    return jsonify(suggestions=autocomplete.suggest(kind, request.args.get('q', ''), limit=limit))
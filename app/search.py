@@ -0,0 +1,72 @@
+# app/search.py
+
+import re
+from typing import List, Dict, Tuple, Union
+from sqlalchemy import event, text
+from app import db
+from app.models import Book, PAGE_SIZE
+
+# title, description, authors
+WEIGHTS = (10.0, 1.0, 5.0)
+
+AUTHORS_OF = """(SELECT group_concat(author.name || ' ' || author.lastname, ' ')
+    FROM bibliographies JOIN author ON author.id = bibliographies.author_id
+    WHERE bibliographies.book_id = {book_id})"""
+
+SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5(
+        title, description, authors, tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS book_fts_insert AFTER INSERT ON book BEGIN
+        INSERT INTO book_fts (rowid, title, description, authors)
+        VALUES (new.id, new.title, new.description, {AUTHORS_OF.format(book_id='new.id')});
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS book_fts_update AFTER UPDATE OF title, description ON book BEGIN
+        UPDATE book_fts SET title = new.title, description = new.description WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS book_fts_delete AFTER DELETE ON book BEGIN
+        DELETE FROM book_fts WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS bibliographies_fts_insert AFTER INSERT ON bibliographies BEGIN
+        UPDATE book_fts SET authors = {AUTHORS_OF.format(book_id='new.book_id')} WHERE rowid = new.book_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS bibliographies_fts_delete AFTER DELETE ON bibliographies BEGIN
+        UPDATE book_fts SET authors = {AUTHORS_OF.format(book_id='old.book_id')} WHERE rowid = old.book_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS author_fts_update AFTER UPDATE OF name, lastname ON author BEGIN
+        UPDATE book_fts SET authors = {AUTHORS_OF.format(book_id='book_fts.rowid')}
+        WHERE rowid IN (SELECT book_id FROM bibliographies WHERE author_id = new.id);
+    END""",
+]
+
+
+@event.listens_for(db.metadata, 'after_create')
+def create_search_index(target, connection, **kw) -> None:
+    """creates the full-text index and its triggers next to the tables made by db.create_all()"""
+    if connection.dialect.name != 'sqlite':
+        return
+    for statement in SCHEMA:
+        connection.execute(text(statement))
+
+
+def match_expression(query: str) -> str:
+    """turns free text into an FTS5 query matching every word as a prefix"""
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_books(query: str, page: int = 1, per_page: int = PAGE_SIZE) -> Tuple[List[Dict[str, Union[str, int]]], bool]:
+    """returns one page of books matching the query, best BM25 rank first,
+    and whether there is a next page"""
+    match = match_expression(query)
+    if not match:
+        return [], False
+    ranked = db.session.execute(text(
+        "SELECT rowid FROM book_fts WHERE book_fts MATCH :match "
+        f"ORDER BY bm25(book_fts, {', '.join(map(str, WEIGHTS))}) LIMIT :limit OFFSET :offset"
+    ), {'match': match, 'limit': per_page + 1, 'offset': (page - 1) * per_page})
+    ids = [book_id for book_id, in ranked]
+    has_next = len(ids) > per_page
+    ids = ids[:per_page]
+    rows = {row.id: row for row in Book.catalog_query().filter(Book.catalog_columns()['id'].in_(ids))}
+    return [Book.catalog_row(rows[book_id]) for book_id in ids if book_id in rows], has_next
@@ -0,0 +1,145 @@
+# app/sqlite.py
+
+import os
+import sqlite3
+import weakref
+from typing import Dict, Optional
+from urllib.parse import quote
+from flask import current_app
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import NullPool, QueuePool, StaticPool
+
+PROFILES = ('default', 'performance')
+READER = 'reader'
+
+_engines = weakref.WeakSet()
+
+
+def dispose_engines() -> None:
+    """drops the pooled connections inherited from the parent, so a forked worker opens its own"""
+    for engine in list(_engines):
+        engine.dispose()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=dispose_engines)
+
+
+def profile_pragmas(config) -> Dict[str, object]:
+    """returns the pragmas of the SQLite profile chosen by SQLITE_PROFILE"""
+    profile = config.get('SQLITE_PROFILE', 'default')
+    if profile not in PROFILES:
+        raise ValueError(f"unknown SQLite profile: {profile}")
+    if profile == 'default':
+        return {}
+    return {
+        # takes effect only on a new database, before its tables are made, see app/maintenance.py
+        'auto_vacuum': 'INCREMENTAL',
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': config['SQLITE_MMAP_SIZE'],
+        'cache_size': config['SQLITE_CACHE_SIZE'],
+        'temp_store': 'MEMORY',
+        'busy_timeout': config['SQLITE_BUSY_TIMEOUT']
+    }
+
+
+def read_only_uri(uri: str) -> Optional[str]:
+    """the uri of the same SQLite file opened read-only, None for other databases and in-memory ones"""
+    url = make_url(uri)
+    if url.drivername != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+    url.query['mode'] = 'ro'
+    return str(url)
+
+
+class RoutingSession(SignallingSession):
+    """sends the queries made while info['read_only'] is set to the read-only connections,
+    except inside a unit of work, while flushing or with unflushed changes, which stay on the primary ones"""
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if self.info.get('read_only') and not self.info.get('unit_of_work') and not self._flushing \
+                and not (self.new or self.dirty or self.deleted):
+            engine = self.db.get_read_engine(self.app)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper, clause)
+
+
+class TunedSQLAlchemy(SQLAlchemy):
+    """SQLAlchemy extension applying the SQLite profile pragmas to every new connection,
+    honouring the pool settings of SQLALCHEMY_ENGINE_OPTIONS for SQLite files,
+    keeping a second pool of read-only connections to the same file when SQLITE_READ_ONLY is on
+    and disposing the engines in a forked child"""
+
+    def init_app(self, app):
+        super().init_app(app)
+        uri = read_only_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+        if app.config.get('SQLITE_READ_ONLY', False) and uri:
+            app.config['SQLALCHEMY_BINDS'] = dict(app.config.get('SQLALCHEMY_BINDS') or {}, **{READER: uri})
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def get_read_engine(self, app=None):
+        """the engine of the read-only connections, None when there is none"""
+        app = self.get_app(app)
+        if READER not in (app.config.get('SQLALCHEMY_BINDS') or {}):
+            return None
+        return self.get_engine(app, bind=READER)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        # Flask-SQLAlchemy picks NullPool for a file without a pool_size before it merges
+        # SQLALCHEMY_ENGINE_OPTIONS into the options, so the configured size is passed in up front
+        pool_size = app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('pool_size')
+        if pool_size:
+            options.setdefault('pool_size', pool_size)
+        return super().apply_driver_hacks(app, sa_url, options)
+
+    def create_engine(self, sa_url, engine_opts):
+        if sa_url.drivername != 'sqlite':
+            return super().create_engine(sa_url, engine_opts)
+        read_only = sa_url.query.get('mode') == 'ro'
+        if read_only:
+            # pysqlite opens a file read-only only through an SQLite URI
+            sa_url.database = 'file:' + quote(sa_url.database)
+            sa_url.query['uri'] = 'true'
+        if engine_opts.get('poolclass') in (NullPool, StaticPool):
+            engine_opts.pop('pool_size', None)
+        elif engine_opts.get('pool_size'):
+            # pysqlite connections are only handed to one thread at a time by the pool
+            engine_opts['poolclass'] = QueuePool
+            engine_opts.setdefault('connect_args', {})['check_same_thread'] = False
+        engine = super().create_engine(sa_url, engine_opts)
+        _engines.add(engine)
+        pragmas = profile_pragmas(current_app.config)
+        if read_only:
+            pragmas = {name: value for name, value in pragmas.items() if name not in ('auto_vacuum', 'journal_mode')}
+            pragmas['query_only'] = 'ON'
+        if pragmas:
+            event.listen(engine, 'connect', lambda connection, record: apply_pragmas(connection, pragmas))
+        if current_app.config.get('WRITE_QUEUE') and not read_only:
+            event.listen(engine, 'connect', lambda connection, record: setattr(connection, 'isolation_level', None))
+            event.listen(engine, 'begin', begin_transaction)
+        return engine
+
+
+def apply_pragmas(connection: sqlite3.Connection, pragmas: Dict[str, object]) -> None:
+    cursor = connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
+def begin_transaction(connection) -> None:
+    """emits BEGIN itself instead of pysqlite, whose own transaction handling breaks savepoints;
+    the sqlite_begin='IMMEDIATE' execution option takes the write lock up front, so a writer waits
+    out busy_timeout for another one instead of failing when its read transaction turns into a write"""
+    mode = connection.get_execution_options().get('sqlite_begin')
+    connection.execute(f"BEGIN {mode}" if mode else "BEGIN")
@@ -0,0 +1,159 @@
+# app/writer.py
+
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class WriteQueueFull(RuntimeError):
+    """raised when a write cannot be queued within WRITE_QUEUE_TIMEOUT, the writer is falling behind"""
+
+
+class WriteTimeout(RuntimeError):
+    """raised when a queued write gets no result within WRITE_QUEUE_TIMEOUT and WRITE_GROUP_TIMEOUT,
+    the write stays queued and may still be committed"""
+
+
+class WriteRequest:
+    """one queued call and the future its caller waits on"""
+
+    def __init__(self, function: Callable, args: tuple, kwargs: dict):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+
+
+class WriteQueue:
+    """serializes the model writes of the process through a single writer thread, which runs
+    the calls waiting in the queue together, each in its own savepoint, and commits them at once"""
+
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.timeout = 5.0
+        self.group_timeout = 30.0
+        self.group_size = 50
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.writes = 0
+        self.failures = 0
+        self.groups = 0
+        self.largest_group = 0
+
+    def init_app(self, app) -> None:
+        """turned on by WRITE_QUEUE; at most WRITE_QUEUE_SIZE calls wait, for WRITE_QUEUE_TIMEOUT seconds,
+        at most WRITE_GROUP_SIZE of them share a commit and a caller waits WRITE_GROUP_TIMEOUT seconds more
+        for its result"""
+        self.app = app
+        self.enabled = app.config.get('WRITE_QUEUE', False)
+        self.timeout = app.config.get('WRITE_QUEUE_TIMEOUT', 5.0)
+        self.group_timeout = app.config.get('WRITE_GROUP_TIMEOUT', 30.0)
+        self.group_size = app.config.get('WRITE_GROUP_SIZE', 50)
+        with self._lock:
+            # a thread started for an earlier app keeps waiting on its own queue, the next write starts one for this
+            self._queue = queue.Queue(maxsize=app.config.get('WRITE_QUEUE_SIZE', 100))
+            self._thread = None
+
+    def in_writer(self) -> bool:
+        return getattr(self._local, 'writer', False)
+
+    def submit(self, function: Callable, *args, **kwargs) -> Any:
+        """runs function(*args, **kwargs) in the writer and returns its result or raises its error,
+        raises WriteQueueFull when the queue stays full for longer than the timeout
+        and WriteTimeout when no result comes within the timeout and the group timeout"""
+        self._start()
+        request = WriteRequest(function, args, kwargs)
+        try:
+            self._queue.put(request, timeout=self.timeout)
+        except queue.Full:
+            raise WriteQueueFull(f"write queue full ({self._queue.maxsize} waiting)") from None
+        try:
+            return request.future.result(timeout=self.timeout + self.group_timeout)
+        except FutureTimeout:
+            raise WriteTimeout(f"no result from the writer in {self.timeout + self.group_timeout:.0f}s") from None
+
+    def _start(self) -> None:
+        with self._lock:
+            # a forked worker inherits the queue but not the thread
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                self._thread = None
+            # a writer killed by an error is replaced, the new one takes over the calls still queued
+            if self._thread is None or not self._thread.is_alive():
+                if self._thread is not None:
+                    logger.error("writer thread died, starting a new one")
+                self._thread = threading.Thread(
+                    target=self._run, args=(self.app, self._queue), name='library-writer', daemon=True
+                )
+                self._pid = os.getpid()
+                self._thread.start()
+
+    def _run(self, app, requests: queue.Queue) -> None:
+        self._local.writer = True
+        with app.app_context():
+            while True:
+                group = [requests.get()]
+                while len(group) < self.group_size:
+                    try:
+                        group.append(requests.get_nowait())
+                    except queue.Empty:
+                        break
+                self._commit_group(group)
+
+    def _commit_group(self, group: List[WriteRequest]) -> None:
+        from app import db
+        from app.models import unit_of_work
+
+        results = []
+        try:
+            with unit_of_work():
+                db.session.connection(execution_options={'sqlite_begin': 'IMMEDIATE'})
+                for request in group:
+                    savepoint = db.session.begin_nested()
+                    try:
+                        result = request.function(*request.args, **request.kwargs)
+                        savepoint.commit()
+                    except Exception as e:
+                        savepoint.rollback()
+                        self.failures += 1
+                        request.future.set_exception(e)
+                    else:
+                        results.append((request, result))
+        except Exception as e:
+            logger.exception("write group of %d failed to commit", len(group))
+            # the calls that did not run yet, when the transaction could not even begin, fail too
+            for request in group:
+                if not request.future.done():
+                    self.failures += 1
+                    request.future.set_exception(e)
+        else:
+            for request, result in results:
+                request.future.set_result(result)
+        finally:
+            db.session.remove()
+        self.groups += 1
+        self.writes += len(group)
+        self.largest_group = max(self.largest_group, len(group))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'writes': self.writes,
+            'failures': self.failures,
+            'groups': self.groups,
+            'largest_group': self.largest_group,
+            'writes_per_group': self.writes / self.groups if self.groups else 0.0
+        }
+
+
+writer = WriteQueue()
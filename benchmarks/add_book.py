@@ -0,0 +1,60 @@
+# benchmarks/add_book.py
+"""measures commits and wall-clock time per Book.add_book on a fresh SQLite database
+
+    python -m benchmarks.add_book [--books N] [--batch]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--books', type=int, default=200)
+parser.add_argument('--batch', action='store_true', help='add all books in one unit of work')
+
+
+def details(number: int) -> dict:
+    return {
+        'title': f'book {number}',
+        'author_name': f'name {number % 50}',
+        'author_lastname': f'lastname {number % 70}',
+        'genre': f'genre {number % 10}',
+        'publisher': f'publisher {number % 20}',
+        'rating': number % 11,
+        'description': 'description'
+    }
+
+
+def main():
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'bench.db')
+    os.environ.setdefault('CACHE_BACKEND', 'none')
+
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from app import db
+    from library import app
+    from app import models
+
+    commits = []
+    event.listen(Session, 'after_commit', lambda session: commits.append(1))
+    with app.app_context():
+        db.create_all()
+        commits.clear()
+        start = time.perf_counter()
+        if args.batch:
+            with models.unit_of_work():
+                for number in range(args.books):
+                    models.Book().add_book(details(number))
+        else:
+            for number in range(args.books):
+                models.Book().add_book(details(number))
+        elapsed = time.perf_counter() - start
+    print(f"books: {args.books}, commits: {len(commits)} ({len(commits) / args.books:.2f} per add_book), "
+          f"ms per add_book: {elapsed * 1000 / args.books:.2f}")
+
+
+if __name__ == '__main__':
+    main()
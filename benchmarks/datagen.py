@@ -0,0 +1,106 @@
+# benchmarks/datagen.py
+"""deterministic synthetic library: the same size and seed always give the same rows"""
+
+import random
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List
+
+SIZES = {'1k': 1000, '10k': 10000, '100k': 100000, '1m': 1000000}
+CHUNK = 10000
+
+NAMES = ['Adam', 'Anna', 'Barbara', 'Celina', 'Dariusz', 'Ewa', 'Filip', 'Halina', 'Jan', 'Joanna',
+         'Krzysztof', 'Maria', 'Milan', 'Olga', 'Piotr', 'Stanisław', 'Teresa', 'Wisława', 'Zofia', 'Zygmunt']
+LASTNAMES = ['Nowak', 'Kowalski', 'Wiśniewski', 'Lem', 'Tokarczuk', 'Kundera', 'Huxley', 'Mrożek',
+             'Szymborska', 'Miłosz', 'Herbert', 'Kapuściński', 'Prus', 'Orzeszkowa', 'Sienkiewicz']
+WORDS = ['ocean', 'wyspa', 'miasto', 'noc', 'dzień', 'księga', 'lato', 'zima', 'las', 'rzeka', 'czas',
+         'pamięć', 'dom', 'droga', 'światło', 'cień', 'sen', 'wiatr', 'góra', 'morze', 'ogień', 'kamień']
+GENRES = ['Powieść', 'Kryminał', 'Fantastyka', 'Reportaż', 'Poezja', 'Dramat', 'Biografia', 'Komiks',
+          'Popularnonaukowa', 'Esej', 'Horror', 'Romans', 'Thriller', 'Literatura faktu', 'Przygodowa']
+
+
+def parse_size(size: str) -> int:
+    """accepts 1k / 10k / 100k / 1m or a plain number of books"""
+    return SIZES.get(size.lower()) or int(size)
+
+
+def chunks(rows: Iterator[Dict], size: int = CHUNK) -> Iterator[List[Dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def generate(books: int, seed: int = 0) -> Dict[str, int]:
+    """fills the tables of a fresh database with the given number of books, their authors, genres,
+    publishers, borrowers, loan cards and loans, returns the number of rows per table"""
+    from app import db
+    from app.models import Author, Book, Borrower, BorrowedBookCard, CatalogVersion, CatalogView, FacetCount, \
+        Genre, Loan, Publisher, bibliographies
+
+    rnd = random.Random(seed)
+    counts = {
+        'book': books,
+        'author': max(10, books // 4),
+        'genre': len(GENRES),
+        'publisher': max(10, books // 50),
+        'borrower': max(10, books // 20),
+        'borrowed_book_card': books // 10,
+        'loan': books // 10
+    }
+    now = datetime.utcnow()
+
+    def insert(table, rows):
+        for chunk in chunks(rows):
+            db.session.execute(table.insert(), chunk)
+        db.session.commit()
+
+    insert(Genre.__table__, ({'id': i + 1, 'genre': genre} for i, genre in enumerate(GENRES)))
+    insert(Publisher.__table__, ({'id': i, 'name': f'Wydawnictwo {i}'} for i in range(1, counts['publisher'] + 1)))
+    insert(Author.__table__, ({
+        'id': i, 'name': rnd.choice(NAMES), 'lastname': f'{rnd.choice(LASTNAMES)} {i}'
+    } for i in range(1, counts['author'] + 1)))
+    insert(Borrower.__table__, ({
+        'id': i, 'name': rnd.choice(NAMES), 'lastname': f'{rnd.choice(LASTNAMES)} {i}'
+    } for i in range(1, counts['borrower'] + 1)))
+    loaned = rnd.sample(range(1, books + 1), counts['borrowed_book_card'])
+    cards = {book_id: card_id for card_id, book_id in enumerate(loaned, 1)}
+    card_rows = [{
+        'id': card_id,
+        'book_id': book_id,
+        'borrower_id': rnd.randint(1, counts['borrower']),
+        'date_of_loan': date(2020, 1, 1) + timedelta(days=rnd.randint(0, 1000)),
+        'borrowed': rnd.random() < 0.5
+    } for book_id, card_id in cards.items()]
+    insert(BorrowedBookCard.__table__, card_rows)
+    insert(Loan.__table__, ({
+        'book_id': card['book_id'],
+        'borrower_id': card['borrower_id'],
+        'loaned_at': datetime.combine(card['date_of_loan'], datetime.min.time()),
+        'due_at': card['date_of_loan'] + timedelta(days=30),
+        'returned_at': None if card['borrowed'] else datetime.combine(card['date_of_loan'], datetime.min.time())
+        + timedelta(days=rnd.randint(1, 60))
+    } for card in card_rows))
+    insert(Book.__table__, ({
+        'id': i,
+        'title': f'{" ".join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 4))).title()} {i}',
+        'genre_id': rnd.randint(1, counts['genre']),
+        'publisher_id': rnd.randint(1, counts['publisher']),
+        'rating': rnd.randint(0, 10),
+        'description': ' '.join(rnd.choice(WORDS) for _ in range(rnd.randint(5, 40))),
+        'borrowed_book_card_id': cards.get(i),
+        'version': 1,
+        'updated_at': now
+    } for i in range(1, books + 1)))
+    insert(bibliographies, ({
+        'book_id': i, 'author_id': rnd.randint(1, counts['author'])
+    } for i in range(1, books + 1)))
+    db.session.merge(CatalogVersion(id=1, version=1, updated_at=now))
+    db.session.commit()
+    CatalogView.rebuild()
+    FacetCount.rebuild()
+    counts['bibliographies'] = books
+    return counts
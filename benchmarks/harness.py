@@ -0,0 +1,151 @@
+# benchmarks/harness.py
+"""times the model methods and routes against a synthetic library and writes the results as JSON
+
+    python -m benchmarks --size 10k [--seed 0] [--repeat 5] [--output results.json] [--db path]
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--size', default='1k', help='1k, 10k, 100k, 1m or a number of books')
+parser.add_argument('--seed', type=int, default=0)
+parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark')
+parser.add_argument('--output', default='-', help="JSON file for the results, '-' prints them")
+parser.add_argument('--db', help='reuse (or create) this database file instead of a temporary one')
+parser.add_argument('--cache', action='store_true', help='keep the read cache on')
+
+
+def measure(function: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """runs the function once to warm up, then repeat times, and returns timings in milliseconds"""
+    function()
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'runs': repeat
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def run(size: int, seed: int, repeat: int, path: str) -> Dict[str, object]:
+    from library import app
+    from app import db
+    from app.models import Book, BorrowedBookCard
+    from benchmarks.datagen import generate
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    results = {}
+    with app.app_context():
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            db.create_all()
+            start = time.perf_counter()
+            generate(size, seed=seed)
+            results['generate'] = {'seconds': round(time.perf_counter() - start, 2)}
+        book_id = size // 2
+        details = dict(Book().get_one(book_id), description='benchmark')
+        counter = iter(range(10 ** 9))
+
+        def add_book():
+            number = next(counter)
+            Book().add_book({
+                'title': f'benchmark {number}', 'author_name': 'Jan', 'author_lastname': f'Bench {number}',
+                'genre': 'Powieść', 'publisher': 'Wydawnictwo 1', 'rating': 5, 'description': ''
+            })
+
+        def update():
+            details['rating'] = (details['rating'] or 0) % 10 + 1
+            Book().update(book_id, details)
+
+        def borrow_and_give_back():
+            BorrowedBookCard().borrow_book(book_id, 'Jan', 'Benchmark')
+            BorrowedBookCard().give_back_book(book_id)
+
+        benchmarks = {
+            'Book.get_all': lambda: Book().get_all(),
+            'Book.get_one': lambda: Book().get_one(book_id),
+            'Book.get_page': lambda: Book().get_page(),
+            'Book.add_book': add_book,
+            'Book.update': update,
+            'BorrowedBookCard.borrow_book+give_back_book': borrow_and_give_back,
+        }
+        for name, function in benchmarks.items():
+            results[name] = measure(function, repeat)
+            db.session.remove()
+
+    routes = {
+        'GET /library/': '/library/',
+        'GET /library/?sort=author': '/library/?sort=author',
+        'GET /library/?sort=-rating&genre=Poezja': '/library/?sort=-rating&genre=Poezja',
+        f'GET /library/{book_id}/': f'/library/{book_id}/',
+        'GET /library/search/?q=ocean': '/library/search/?q=ocean',
+        'GET /library/stream/?format=json': '/library/stream/?format=json',
+        'GET /library/export?format=csv': '/library/export?format=csv',
+        'GET /loans/overdue/': '/loans/overdue/',
+        'GET /api/books/?limit=500': '/api/books/?limit=500',
+        'GET /api/facets/': '/api/facets/',
+        'GET /api/facets/?genre=Poezja': '/api/facets/?genre=Poezja',
+    }
+    for name, url in routes.items():
+        response = client.get(url)
+        response.get_data()
+        if response.status_code != 200:
+            raise RuntimeError(f"{name} answered {response.status_code}")
+        results[name] = measure(lambda: client.get(url).get_data(), repeat)
+    return results
+
+
+def main():
+    from benchmarks.datagen import parse_size
+
+    args = parser.parse_args()
+    size = parse_size(args.size)
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'benchmark.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(path)
+    if not args.cache:
+        os.environ['CACHE_BACKEND'] = 'none'
+
+    report = {
+        'size': size,
+        'seed': args.seed,
+        'started_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'git': git_revision(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'cache': args.cache,
+        'results': run(size, args.seed, args.repeat, path)
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
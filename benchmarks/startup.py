@@ -0,0 +1,75 @@
+# benchmarks/startup.py
+"""measures import time, cold start (import and first request) and a CLI call in fresh interpreters
+
+    python -m benchmarks.startup [--runs 5] [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per measurement')
+parser.add_argument('--output', default='-', help="JSON file for the results, '-' prints them")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import library
+imported = time.perf_counter()
+response = library.app.test_client().get('/library/')
+response.get_data()
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'cold_start_ms': (served - start) * 1000,
+    'status': response.status_code,
+    'loaded': sorted(name for name in ('alembic', 'flask_migrate', 'IPython') if name in sys.modules)
+}))
+"""
+
+
+def probe() -> dict:
+    output = subprocess.run([sys.executable, '-c', PROBE], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def cli() -> float:
+    env = dict(os.environ, FLASK_APP='library.py')
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'flask', 'routes'], env=env, capture_output=True, check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def summary(timings) -> dict:
+    return {'min_ms': round(min(timings), 1), 'median_ms': round(statistics.median(timings), 1)}
+
+
+def main():
+    args = parser.parse_args()
+    probes = [probe() for _ in range(args.runs)]
+    if any(result['status'] != 200 for result in probes):
+        raise RuntimeError("GET /library/ did not answer 200")
+    report = {
+        'python': sys.version.split()[0],
+        'runs': args.runs,
+        'import': summary([result['import_ms'] for result in probes]),
+        'cold_start': summary([result['cold_start_ms'] for result in probes]),
+        'flask routes': summary([cli() for _ in range(args.runs)]),
+        'loaded_on_import': probes[0]['loaded']
+    }
+    output = json.dumps(report, indent=2)
+    if args.output == '-':
+        print(output)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+# benchmarks/write_stress.py
+"""runs add_book / borrow_book / give_back_book from many processes and threads at once against one
+SQLite file, optionally with reader threads fetching book pages meanwhile, and reports lock errors and
+throughput, exits with 1 if any write hit a lock error
+
+    python -m benchmarks.write_stress [--processes 4] [--threads 8] [--writes 60] [--queue] [--books 1000]
+                                      [--readers 0]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+parser.add_argument('--processes', type=int, default=4, help='worker processes, like gunicorn workers')
+parser.add_argument('--threads', type=int, default=8, help='threads per process')
+parser.add_argument('--writes', type=int, default=60, help='writes per thread')
+parser.add_argument('--books', type=int, default=1000, help='size of the library written to')
+parser.add_argument('--queue', action='store_true', help='turn WRITE_QUEUE on')
+parser.add_argument('--readers', type=int, default=0, help='threads per process reading GET /library/<id>/')
+
+
+def write(number: int, book_id: int, title: str) -> None:
+    from app.models import Book, BorrowedBookCard
+
+    operation = number % 3
+    if operation == 0:
+        Book().add_book({
+            'title': title, 'author_name': 'Jan', 'author_lastname': 'Stress', 'genre': 'Powieść',
+            'publisher': 'Wydawnictwo 1', 'rating': 5, 'description': ''
+        })
+    elif operation == 1:
+        BorrowedBookCard().borrow_book(book_id, 'Jan', 'Stress')
+    else:
+        BorrowedBookCard().give_back_book(book_id)
+
+
+def worker(process: int, args: argparse.Namespace, barrier, results) -> None:
+    from sqlalchemy.exc import OperationalError
+    from app import db
+    from library import app
+    from app.writer import writer
+
+    counts = {'ok': 0, 'lock_errors': 0, 'errors': 0, 'reads': 0, 'read_errors': 0}
+    lock = threading.Lock()
+    writing = threading.Event()
+
+    def run(thread: int) -> None:
+        with app.app_context():
+            slot = process * args.threads + thread
+            for number in range(args.writes):
+                book_id = 1 + (slot * args.writes + number // 3) % args.books
+                try:
+                    write(number, book_id, f'stress {process}-{thread}-{number}')
+                    outcome = 'ok'
+                except OperationalError as e:
+                    db.session.rollback()
+                    outcome = 'lock_errors' if 'locked' in str(e) else 'errors'
+                except Exception:
+                    db.session.rollback()
+                    outcome = 'errors'
+                with lock:
+                    counts[outcome] += 1
+            db.session.remove()
+
+    def read(thread: int) -> None:
+        client = app.test_client()
+        number = 0
+        while writing.is_set():
+            book_id = 1 + (process * args.readers + thread + number * 7) % args.books
+            outcome = 'reads' if client.get(f'/library/{book_id}/').status_code == 200 else 'read_errors'
+            number += 1
+            with lock:
+                counts[outcome] += 1
+
+    threads = [threading.Thread(target=run, args=(thread,)) for thread in range(args.threads)]
+    readers = [threading.Thread(target=read, args=(thread,)) for thread in range(args.readers)]
+    barrier.wait()
+    writing.set()
+    for thread in threads + readers:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writing.clear()
+    for thread in readers:
+        thread.join()
+    counts['writer'] = writer.stats()
+    results.put(counts)
+
+
+def main():
+    args = parser.parse_args()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'stress.db')
+    os.environ['CACHE_BACKEND'] = 'none'
+    os.environ['WRITE_QUEUE'] = '1' if args.queue else '0'
+
+    from app import db
+    from library import app
+    from benchmarks.datagen import generate
+
+    with app.app_context():
+        db.create_all()
+        generate(args.books)
+        db.session.remove()
+        db.engine.dispose()
+
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(args.processes + 1)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(process, args, barrier, results))
+                 for process in range(args.processes)]
+    for process in processes:
+        process.start()
+    barrier.wait()
+    start = time.perf_counter()
+    counts = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join()
+
+    total = args.processes * args.threads * args.writes
+    report = {
+        'write_queue': args.queue,
+        'processes': args.processes,
+        'threads': args.threads,
+        'writes': total,
+        'ok': sum(count['ok'] for count in counts),
+        'lock_errors': sum(count['lock_errors'] for count in counts),
+        'errors': sum(count['errors'] for count in counts),
+        'seconds': round(elapsed, 2),
+        'writes_per_second': round(total / elapsed, 1),
+        'reads': sum(count['reads'] for count in counts),
+        'read_errors': sum(count['read_errors'] for count in counts),
+        'reads_per_second': round(sum(count['reads'] for count in counts) / elapsed, 1),
+        'writers': [count['writer'] for count in counts] if args.queue else []
+    }
+    print(json.dumps(report, indent=2))
+    return 1 if report['lock_errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
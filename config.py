@@ -12,4 +12,38 @@ class Config:
         os.environ.get('DATABASE_URL') or
         'sqlite:///' + os.path.join(BASE_DIR, 'library.db')
     )
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or 'lru'
+    CACHE_SIZE = int(os.environ.get('CACHE_SIZE') or 256)
+    CACHE_TTL = int(os.environ.get('CACHE_TTL') or 300)
+    CACHE_PATH = os.environ.get('CACHE_PATH') or os.path.join(BASE_DIR, 'cache.db')
+    FRAGMENT_CACHE_BYTES = int(os.environ.get('FRAGMENT_CACHE_BYTES') or 16 * 1024 * 1024)
+    COMPRESS = os.environ.get('COMPRESS', '1').lower() in ('1', 'true', 'yes')
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL') or 6)
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE') or 500)
+    COMPRESS_CACHE_BYTES = int(os.environ.get('COMPRESS_CACHE_BYTES') or 32 * 1024 * 1024)
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DATABASE_POOL_SIZE') or 5),
+        'pool_recycle': int(os.environ.get('DATABASE_POOL_RECYCLE') or 3600)
+    }
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE') or 'performance'
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 256 * 1024 * 1024)
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE') or -64 * 1024)
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000)
+    SQLITE_READ_ONLY = os.environ.get('SQLITE_READ_ONLY', '1').lower() in ('1', 'true', 'yes')
+    SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+    SQL_SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS') or 100)
+    SQL_MAX_REPEATS = int(os.environ.get('SQL_MAX_REPEATS') or 10)
+    LOAN_PERIOD_DAYS = int(os.environ.get('LOAN_PERIOD_DAYS') or 30)
+    AUTOCOMPLETE_LIMIT = int(os.environ.get('AUTOCOMPLETE_LIMIT') or 10)
+    AUTOCOMPLETE_TTL = float(os.environ.get('AUTOCOMPLETE_TTL') or 60)
+    CATALOG_VIEW = os.environ.get('CATALOG_VIEW', '1').lower() in ('1', 'true', 'yes')
+    WRITE_QUEUE = os.environ.get('WRITE_QUEUE', '').lower() in ('1', 'true', 'yes')
+    WRITE_QUEUE_SIZE = int(os.environ.get('WRITE_QUEUE_SIZE') or 100)
+    WRITE_QUEUE_TIMEOUT = float(os.environ.get('WRITE_QUEUE_TIMEOUT') or 5)
+    WRITE_GROUP_TIMEOUT = float(os.environ.get('WRITE_GROUP_TIMEOUT') or 30)
+    WRITE_GROUP_SIZE = int(os.environ.get('WRITE_GROUP_SIZE') or 50)
+    MAINTENANCE_INTERVAL = float(os.environ.get('MAINTENANCE_INTERVAL') or 0)
+    MAINTENANCE_BATCH_SIZE = int(os.environ.get('MAINTENANCE_BATCH_SIZE') or 500)
+    MAINTENANCE_ANALYSIS_LIMIT = int(os.environ.get('MAINTENANCE_ANALYSIS_LIMIT') or 1000)
+    MAINTENANCE_LOCK = os.environ.get('MAINTENANCE_LOCK') or os.path.join(BASE_DIR, 'maintenance.lock')
@@ -0,0 +1,44 @@
+"""create table facet count
+
+Revision ID: 2b9d6e4c8a17
+Revises: 8e3c5a7f1b20
+Create Date: 2026-10-18 17:40:12.301458
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b9d6e4c8a17'
+down_revision = '8e3c5a7f1b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('facet_count',
+    sa.Column('facet', sa.String(length=20), nullable=False),
+    sa.Column('value', sa.String(length=101), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('facet', 'value')
+    )
+    op.create_index('ix_facet_count_facet_count', 'facet_count', ['facet', 'count'], unique=False)
+    op.execute(
+        "INSERT INTO facet_count (facet, value, count) "
+        "SELECT facet, value, count(*) FROM ("
+        "SELECT 'genre' AS facet, genre.genre AS value FROM book JOIN genre ON genre.id = book.genre_id "
+        "UNION ALL SELECT 'publisher', publisher.name FROM book JOIN publisher ON publisher.id = book.publisher_id "
+        "UNION ALL SELECT 'author', author.name || ' ' || author.lastname FROM book "
+        "JOIN bibliographies ON bibliographies.book_id = book.id JOIN author ON author.id = bibliographies.author_id "
+        "UNION ALL SELECT 'rating', CASE WHEN book.rating IS NULL THEN 'brak' WHEN book.rating <= 3 THEN '0-3' "
+        "WHEN book.rating <= 6 THEN '4-6' WHEN book.rating <= 8 THEN '7-8' ELSE '9-10' END FROM book "
+        "UNION ALL SELECT 'status', CASE WHEN borrowed_book_card.borrowed IS 1 THEN 'borrowed' ELSE 'available' END "
+        "FROM book LEFT OUTER JOIN borrowed_book_card ON borrowed_book_card.id = book.borrowed_book_card_id"
+        ") WHERE value IS NOT NULL GROUP BY facet, value"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_facet_count_facet_count', table_name='facet_count')
+    op.drop_table('facet_count')
@@ -0,0 +1,31 @@
+"""add catalog view version stamp
+
+Revision ID: 5f1e0b7c3d92
+Revises: 2b9d6e4c8a17
+Create Date: 2026-10-18 21:12:47.530196
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f1e0b7c3d92'
+down_revision = '2b9d6e4c8a17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('catalog_view', sa.Column('version', sa.Integer(), nullable=True))
+    op.add_column('catalog_view', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute(
+        "UPDATE catalog_view SET "
+        "version = (SELECT book.version FROM book WHERE book.id = catalog_view.book_id), "
+        "updated_at = (SELECT book.updated_at FROM book WHERE book.id = catalog_view.book_id)"
+    )
+
+
+def downgrade():
+    op.drop_column('catalog_view', 'updated_at')
+    op.drop_column('catalog_view', 'version')
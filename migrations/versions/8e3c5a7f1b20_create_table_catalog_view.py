@@ -0,0 +1,61 @@
+"""create table catalog view
+
+Revision ID: 8e3c5a7f1b20
+Revises: c6f1d84b2e59
+Create Date: 2026-10-18 16:21:09.774512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e3c5a7f1b20'
+down_revision = 'c6f1d84b2e59'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('catalog_view',
+    sa.Column('book_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('title', sa.String(length=100), nullable=True),
+    sa.Column('author', sa.Text(), nullable=True),
+    sa.Column('author_lastname', sa.String(length=30), nullable=True),
+    sa.Column('genre', sa.String(length=50), nullable=True),
+    sa.Column('publisher', sa.String(length=50), nullable=True),
+    sa.Column('rating', sa.Integer(), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('borrowed', sa.Boolean(), nullable=False),
+    sa.CheckConstraint('borrowed IN (0, 1)'),
+    sa.PrimaryKeyConstraint('book_id')
+    )
+    op.create_index('ix_catalog_view_title_book_id', 'catalog_view', ['title', 'book_id'], unique=False)
+    op.create_index('ix_catalog_view_author_lastname_book_id', 'catalog_view', ['author_lastname', 'book_id'],
+                    unique=False)
+    op.create_index('ix_catalog_view_rating_book_id', 'catalog_view', ['rating', 'book_id'], unique=False)
+    op.create_index('ix_catalog_view_genre_title', 'catalog_view', ['genre', 'title'], unique=False)
+    op.create_index('ix_catalog_view_publisher_title', 'catalog_view', ['publisher', 'title'], unique=False)
+    op.execute(
+        "INSERT INTO catalog_view "
+        "(book_id, title, author, author_lastname, genre, publisher, rating, description, borrowed) "
+        "SELECT book.id, book.title, "
+        "(SELECT group_concat(author.name || ' ' || author.lastname, ', ') FROM author "
+        "JOIN bibliographies ON bibliographies.author_id = author.id WHERE bibliographies.book_id = book.id), "
+        "(SELECT min(author.lastname) FROM author "
+        "JOIN bibliographies ON bibliographies.author_id = author.id WHERE bibliographies.book_id = book.id), "
+        "genre.genre, publisher.name, book.rating, book.description, coalesce(borrowed_book_card.borrowed, 0) "
+        "FROM book "
+        "LEFT OUTER JOIN genre ON genre.id = book.genre_id "
+        "LEFT OUTER JOIN publisher ON publisher.id = book.publisher_id "
+        "LEFT OUTER JOIN borrowed_book_card ON borrowed_book_card.id = book.borrowed_book_card_id"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_catalog_view_publisher_title', table_name='catalog_view')
+    op.drop_index('ix_catalog_view_genre_title', table_name='catalog_view')
+    op.drop_index('ix_catalog_view_rating_book_id', table_name='catalog_view')
+    op.drop_index('ix_catalog_view_author_lastname_book_id', table_name='catalog_view')
+    op.drop_index('ix_catalog_view_title_book_id', table_name='catalog_view')
+    op.drop_table('catalog_view')
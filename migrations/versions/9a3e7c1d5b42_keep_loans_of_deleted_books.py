@@ -0,0 +1,50 @@
+"""keep loans of deleted books: nullable loan book_id and the title of the book
+
+Revision ID: 9a3e7c1d5b42
+Revises: 5f1e0b7c3d92
+Create Date: 2026-10-18 12:40:03.184527
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a3e7c1d5b42'
+down_revision = '5f1e0b7c3d92'
+branch_labels = None
+depends_on = None
+
+# the partial indexes are dropped around the batch, whose copy of the table would recreate them without WHERE
+PARTIAL_INDEXES = (
+    ('ix_loan_returned_at', ['returned_at'], False, 'returned_at IS NOT NULL'),
+    ('ix_loan_open_book_id', ['book_id'], True, 'returned_at IS NULL'),
+    ('ix_loan_open_due_at', ['due_at'], False, 'returned_at IS NULL'),
+)
+
+
+def drop_partial_indexes():
+    for name, _, _, _ in PARTIAL_INDEXES:
+        op.drop_index(name, table_name='loan')
+
+
+def create_partial_indexes():
+    for name, columns, unique, where in PARTIAL_INDEXES:
+        op.create_index(name, 'loan', columns, unique=unique, sqlite_where=sa.text(where))
+
+
+def upgrade():
+    drop_partial_indexes()
+    with op.batch_alter_table('loan') as batch_op:
+        batch_op.alter_column('book_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.add_column(sa.Column('title', sa.String(length=100), nullable=True))
+    create_partial_indexes()
+
+
+def downgrade():
+    drop_partial_indexes()
+    op.execute("DELETE FROM loan WHERE book_id IS NULL")
+    with op.batch_alter_table('loan') as batch_op:
+        batch_op.drop_column('title')
+        batch_op.alter_column('book_id', existing_type=sa.Integer(), nullable=False)
+    create_partial_indexes()
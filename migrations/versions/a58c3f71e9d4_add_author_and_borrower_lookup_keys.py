@@ -0,0 +1,79 @@
+"""add author and borrower lookup keys, merge duplicate authors and borrowers
+
+Revision ID: a58c3f71e9d4
+Revises: f2b64d9e1a35
+Create Date: 2026-10-18 13:05:42.381920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a58c3f71e9d4'
+down_revision = 'f2b64d9e1a35'
+branch_labels = None
+depends_on = None
+
+
+def person_key(name, lastname):
+    return f"{' '.join((lastname or '').split()).casefold()}\t{' '.join((name or '').split()).casefold()}"
+
+
+def backfill(connection, table, merge):
+    """fills lookup_key and merges every group of rows sharing a key into the one with the lowest id"""
+    survivors = {}
+    for _id, name, lastname in connection.execute(sa.text(f"SELECT id, name, lastname FROM {table} ORDER BY id")):
+        key = person_key(name, lastname)
+        if key in survivors:
+            merge(connection, _id, survivors[key])
+            connection.execute(sa.text(f"DELETE FROM {table} WHERE id = :id"), {'id': _id})
+        else:
+            survivors[key] = _id
+            connection.execute(sa.text(f"UPDATE {table} SET lookup_key = :key WHERE id = :id"), {'key': key, 'id': _id})
+
+
+def merge_author(connection, duplicate_id, survivor_id):
+    connection.execute(sa.text(
+        "INSERT INTO merged_books SELECT book_id FROM bibliographies WHERE author_id = :duplicate"
+    ), {'duplicate': duplicate_id})
+    connection.execute(sa.text(
+        "DELETE FROM bibliographies WHERE author_id = :duplicate AND book_id IN "
+        "(SELECT book_id FROM bibliographies WHERE author_id = :survivor)"
+    ), {'duplicate': duplicate_id, 'survivor': survivor_id})
+    connection.execute(sa.text(
+        "UPDATE bibliographies SET author_id = :survivor WHERE author_id = :duplicate"
+    ), {'duplicate': duplicate_id, 'survivor': survivor_id})
+
+
+def merge_borrower(connection, duplicate_id, survivor_id):
+    connection.execute(sa.text(
+        "UPDATE borrowed_book_card SET borrower_id = :survivor WHERE borrower_id = :duplicate"
+    ), {'duplicate': duplicate_id, 'survivor': survivor_id})
+
+
+def upgrade():
+    op.add_column('author', sa.Column('lookup_key', sa.String(length=60), nullable=True))
+    op.add_column('borrower', sa.Column('lookup_key', sa.String(length=60), nullable=True))
+    connection = op.get_bind()
+    connection.execute(sa.text("CREATE TEMP TABLE merged_books (book_id INTEGER)"))
+    backfill(connection, 'author', merge_author)
+    backfill(connection, 'borrower', merge_borrower)
+    # the full-text index triggers do not see bibliographies rows being re-pointed
+    connection.execute(sa.text(
+        "UPDATE book_fts SET authors = (SELECT group_concat(author.name || ' ' || author.lastname, ' ') "
+        "FROM bibliographies JOIN author ON author.id = bibliographies.author_id "
+        "WHERE bibliographies.book_id = book_fts.rowid) "
+        "WHERE rowid IN (SELECT book_id FROM merged_books)"
+    ))
+    connection.execute(sa.text("DROP TABLE merged_books"))
+    op.create_index(op.f('ix_author_lookup_key'), 'author', ['lookup_key'], unique=True)
+    op.create_index(op.f('ix_borrower_lookup_key'), 'borrower', ['lookup_key'], unique=True)
+
+
+def downgrade():
+    # merged duplicates are not restored
+    op.drop_index(op.f('ix_borrower_lookup_key'), table_name='borrower')
+    op.drop_index(op.f('ix_author_lookup_key'), table_name='author')
+    op.drop_column('borrower', 'lookup_key')
+    op.drop_column('author', 'lookup_key')
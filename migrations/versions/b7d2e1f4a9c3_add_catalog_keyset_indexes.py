@@ -0,0 +1,32 @@
+"""add catalog keyset indexes: book rating, genre, publisher, card and bibliographies author
+
+Revision ID: b7d2e1f4a9c3
+Revises: 4f0695f6d9b9
+Create Date: 2026-10-18 10:12:40.512386
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e1f4a9c3'
+down_revision = '4f0695f6d9b9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_book_rating_id', 'book', ['rating', 'id'], unique=False)
+    op.create_index('ix_book_genre_id_title', 'book', ['genre_id', 'title'], unique=False)
+    op.create_index('ix_book_publisher_id_title', 'book', ['publisher_id', 'title'], unique=False)
+    op.create_index('ix_book_borrowed_book_card_id', 'book', ['borrowed_book_card_id'], unique=False)
+    op.create_index('ix_bibliographies_author_id_book_id', 'bibliographies', ['author_id', 'book_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_bibliographies_author_id_book_id', table_name='bibliographies')
+    op.drop_index('ix_book_borrowed_book_card_id', table_name='book')
+    op.drop_index('ix_book_publisher_id_title', table_name='book')
+    op.drop_index('ix_book_genre_id_title', table_name='book')
+    op.drop_index('ix_book_rating_id', table_name='book')
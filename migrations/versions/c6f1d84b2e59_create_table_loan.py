@@ -0,0 +1,56 @@
+"""create table loan
+
+Revision ID: c6f1d84b2e59
+Revises: a58c3f71e9d4
+Create Date: 2026-10-18 15:02:41.530817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c6f1d84b2e59'
+down_revision = 'a58c3f71e9d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('loan',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('book_id', sa.Integer(), nullable=False),
+    sa.Column('borrower_id', sa.Integer(), nullable=False),
+    sa.Column('loaned_at', sa.DateTime(), nullable=False),
+    sa.Column('due_at', sa.Date(), nullable=False),
+    sa.Column('returned_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['book_id'], ['book.id'], ),
+    sa.ForeignKeyConstraint(['borrower_id'], ['borrower.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_loan_loaned_at', 'loan', ['loaned_at'], unique=False)
+    op.create_index('ix_loan_returned_at', 'loan', ['returned_at'], unique=False,
+                    sqlite_where=sa.text('returned_at IS NOT NULL'))
+    op.create_index('ix_loan_borrower_id_loaned_at', 'loan', ['borrower_id', 'loaned_at'], unique=False)
+    op.create_index('ix_loan_open_book_id', 'loan', ['book_id'], unique=True,
+                    sqlite_where=sa.text('returned_at IS NULL'))
+    op.create_index('ix_loan_open_due_at', 'loan', ['due_at'], unique=False,
+                    sqlite_where=sa.text('returned_at IS NULL'))
+    # the cards only know the books that are out right now, so those become the open loans
+    op.execute(
+        "INSERT INTO loan (book_id, borrower_id, loaned_at, due_at) "
+        "SELECT book_id, borrower_id, coalesce(date_of_loan, date('now')) || ' 00:00:00.000000', "
+        "date(coalesce(date_of_loan, date('now')), '+30 days') "
+        "FROM borrowed_book_card "
+        "WHERE borrowed = 1 AND book_id IS NOT NULL AND borrower_id IS NOT NULL "
+        "GROUP BY book_id"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_loan_open_due_at', table_name='loan')
+    op.drop_index('ix_loan_open_book_id', table_name='loan')
+    op.drop_index('ix_loan_borrower_id_loaned_at', table_name='loan')
+    op.drop_index('ix_loan_returned_at', table_name='loan')
+    op.drop_index('ix_loan_loaned_at', table_name='loan')
+    op.drop_table('loan')
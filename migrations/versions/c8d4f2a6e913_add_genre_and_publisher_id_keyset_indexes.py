@@ -0,0 +1,36 @@
+"""add genre and publisher (value, id) keyset indexes to book and catalog_view, list the authors by lastname
+
+Revision ID: c8d4f2a6e913
+Revises: 9a3e7c1d5b42
+Create Date: 2026-10-18 13:05:21.640918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8d4f2a6e913'
+down_revision = '9a3e7c1d5b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_book_genre_id_id', 'book', ['genre_id', 'id'], unique=False)
+    op.create_index('ix_catalog_view_genre_book_id', 'catalog_view', ['genre', 'book_id'], unique=False)
+    op.create_index('ix_catalog_view_publisher_book_id', 'catalog_view', ['publisher', 'book_id'], unique=False)
+    # the first author listed is the one author_lastname sorts the book under
+    op.execute(
+        "UPDATE catalog_view SET author = (SELECT group_concat(name || ' ' || lastname, ', ') FROM "
+        "(SELECT author.name, author.lastname FROM author "
+        "JOIN bibliographies ON bibliographies.author_id = author.id "
+        "WHERE bibliographies.book_id = catalog_view.book_id "
+        "ORDER BY author.lastname, author.name, author.id))"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_catalog_view_publisher_book_id', table_name='catalog_view')
+    op.drop_index('ix_catalog_view_genre_book_id', table_name='catalog_view')
+    op.drop_index('ix_book_genre_id_id', table_name='book')
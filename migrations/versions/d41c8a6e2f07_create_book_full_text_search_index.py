@@ -0,0 +1,59 @@
+"""create book full-text search index: book_fts with sync triggers
+
+Revision ID: d41c8a6e2f07
+Revises: b7d2e1f4a9c3
+Create Date: 2026-10-18 11:02:17.204551
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41c8a6e2f07'
+down_revision = 'b7d2e1f4a9c3'
+branch_labels = None
+depends_on = None
+
+AUTHORS_OF = """(SELECT group_concat(author.name || ' ' || author.lastname, ' ')
+    FROM bibliographies JOIN author ON author.id = bibliographies.author_id
+    WHERE bibliographies.book_id = {book_id})"""
+
+TRIGGERS = {
+    'book_fts_insert': f"""AFTER INSERT ON book BEGIN
+        INSERT INTO book_fts (rowid, title, description, authors)
+        VALUES (new.id, new.title, new.description, {AUTHORS_OF.format(book_id='new.id')});
+    END""",
+    'book_fts_update': """AFTER UPDATE OF title, description ON book BEGIN
+        UPDATE book_fts SET title = new.title, description = new.description WHERE rowid = new.id;
+    END""",
+    'book_fts_delete': """AFTER DELETE ON book BEGIN
+        DELETE FROM book_fts WHERE rowid = old.id;
+    END""",
+    'bibliographies_fts_insert': f"""AFTER INSERT ON bibliographies BEGIN
+        UPDATE book_fts SET authors = {AUTHORS_OF.format(book_id='new.book_id')} WHERE rowid = new.book_id;
+    END""",
+    'bibliographies_fts_delete': f"""AFTER DELETE ON bibliographies BEGIN
+        UPDATE book_fts SET authors = {AUTHORS_OF.format(book_id='old.book_id')} WHERE rowid = old.book_id;
+    END""",
+    'author_fts_update': f"""AFTER UPDATE OF name, lastname ON author BEGIN
+        UPDATE book_fts SET authors = {AUTHORS_OF.format(book_id='book_fts.rowid')}
+        WHERE rowid IN (SELECT book_id FROM bibliographies WHERE author_id = new.id);
+    END""",
+}
+
+
+def upgrade():
+    op.execute("""CREATE VIRTUAL TABLE book_fts USING fts5(
+        title, description, authors, tokenize = 'unicode61 remove_diacritics 2'
+    )""")
+    op.execute(f"""INSERT INTO book_fts (rowid, title, description, authors)
+        SELECT book.id, book.title, book.description, {AUTHORS_OF.format(book_id='book.id')} FROM book""")
+    for name, body in TRIGGERS.items():
+        op.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def downgrade():
+    for name in reversed(list(TRIGGERS)):
+        op.execute(f"DROP TRIGGER {name}")
+    op.execute("DROP TABLE book_fts")
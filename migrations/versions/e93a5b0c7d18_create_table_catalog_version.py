@@ -0,0 +1,31 @@
+"""create table catalog version
+
+Revision ID: e93a5b0c7d18
+Revises: d41c8a6e2f07
+Create Date: 2026-10-18 11:48:03.119274
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e93a5b0c7d18'
+down_revision = 'd41c8a6e2f07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    catalog_version = op.create_table('catalog_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(catalog_version, [{'id': 1, 'version': 1, 'updated_at': datetime.utcnow()}])
+
+
+def downgrade():
+    op.drop_table('catalog_version')
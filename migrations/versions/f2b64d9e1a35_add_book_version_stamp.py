@@ -0,0 +1,27 @@
+"""add book version stamp: version, updated_at
+
+Revision ID: f2b64d9e1a35
+Revises: e93a5b0c7d18
+Create Date: 2026-10-18 12:20:51.667032
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b64d9e1a35'
+down_revision = 'e93a5b0c7d18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('book', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('book', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute("UPDATE book SET updated_at = CURRENT_TIMESTAMP")
+
+
+def downgrade():
+    op.drop_column('book', 'updated_at')
+    op.drop_column('book', 'version')
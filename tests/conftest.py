@@ -0,0 +1,21 @@
+# tests/conftest.py
+
+import pytest
+from app import create_app, db
+from app.sqlite import dispose_engines
+from config import Config
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """builds apps on fresh SQLite files in tmp_path without the read cache, settings override the Config"""
+    def make(name: str = 'library.db', **settings):
+        settings.setdefault('CACHE_BACKEND', 'none')
+        config = type('TestConfig', (Config,), dict(
+            SQLALCHEMY_DATABASE_URI='sqlite:///' + str(tmp_path / name), **settings
+        ))
+        return create_app(config)
+
+    yield make
+    db.session.remove()
+    dispose_engines()
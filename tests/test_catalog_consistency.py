@@ -0,0 +1,62 @@
+# tests/test_catalog_consistency.py
+
+import io
+import pytest
+from sqlalchemy import func, select, union_all
+from app import db
+from app.importer import import_books
+from app.models import Book, BorrowedBookCard, CatalogView, FacetCount
+from benchmarks.datagen import generate
+
+BORROWED = 8
+IMPORT = """title,author_name,author_lastname,genre,publisher,rating,description
+Importowana Pierwsza,Ewa,Importowa,Nowy Gatunek,Nowe Wydawnictwo,4,
+Importowana Druga,Ewa,Importowa,Powieść,Nowe Wydawnictwo,,opis
+"""
+
+
+def normalized(rows) -> list:
+    return sorted(tuple(row[:BORROWED]) + (bool(row[BORROWED]),) + tuple(row[BORROWED + 1:]) for row in rows)
+
+
+def assert_in_step():
+    """compares catalog_view with the rows computed from the tables and facet_count with a recount"""
+    view = db.session.query(*CatalogView.__table__.columns)
+    assert normalized(view) == normalized(CatalogView.source_query())
+    pairs = union_all(*FacetCount.facet_queries()).alias('pairs')
+    facet, value = pairs.c
+    recount = db.session.execute(select([facet, value, func.count()]).where(value.isnot(None)).group_by(facet, value))
+    counts = db.session.query(FacetCount.facet, FacetCount.value, FacetCount.count).filter(FacetCount.count != 0)
+    assert sorted(counts) == sorted(tuple(row) for row in recount)
+
+
+@pytest.mark.parametrize('write_queue', [False, True])
+def test_view_and_facets_follow_every_write(make_app, write_queue):
+    app = make_app(CATALOG_VIEW=True, WRITE_QUEUE=write_queue)
+    with app.app_context():
+        db.create_all()
+        generate(50)
+        assert_in_step()
+
+        Book().add_book({'title': 'spójna książka', 'author_name': 'ala', 'author_lastname': 'spójna',
+                         'genre': 'nowy gatunek', 'publisher': 'nowe wydawnictwo', 'rating': 3, 'description': ''})
+        assert_in_step()
+
+        book_id = Book().is_title_in_base('Spójna Książka')
+        details = Book().get_one(book_id)
+        details.update(title='spójna książka 2', author_lastname='zmieniona', genre='inny gatunek', rating=9)
+        Book().update(book_id, details)
+        assert_in_step()
+
+        BorrowedBookCard().borrow_book(book_id, 'Jan', 'Czytelnik')
+        assert_in_step()
+        BorrowedBookCard().give_back_book(book_id)
+        assert_in_step()
+
+        Book().delete(book_id)
+        assert_in_step()
+
+        importer = import_books(io.StringIO(IMPORT), 'csv')
+        assert importer.imported == 2
+        assert_in_step()
+        db.session.remove()
@@ -0,0 +1,39 @@
+# tests/test_catalog_queries.py
+
+import pytest
+from app import db
+from app.instrumentation import count_queries, max_repeats
+from app.models import Book
+from benchmarks.datagen import generate
+
+BOOKS = 100
+
+
+def catalog_queries(app, books: int):
+    """seeds the app's database with the books and returns the statements run by get_all and get_one"""
+    with app.app_context():
+        db.create_all()
+        generate(books)
+        with count_queries() as all_books:
+            assert len(Book().get_all()) == books
+        with count_queries() as one_book:
+            Book().get_one(books // 2)
+        db.session.remove()
+    return all_books.count, one_book.count
+
+
+@pytest.mark.parametrize('catalog_view', [True, False])
+def test_query_count_does_not_grow_with_the_catalog(make_app, catalog_view):
+    small = catalog_queries(make_app('small.db', CATALOG_VIEW=catalog_view), BOOKS)
+    large = catalog_queries(make_app('large.db', CATALOG_VIEW=catalog_view), 10 * BOOKS)
+    assert small == large
+
+
+@pytest.mark.parametrize('catalog_view', [True, False])
+def test_get_all_runs_no_statement_per_row(make_app, catalog_view):
+    app = make_app(CATALOG_VIEW=catalog_view)
+    with app.app_context():
+        db.create_all()
+        generate(BOOKS)
+        with max_repeats(1):
+            Book().get_all()
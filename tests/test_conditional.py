@@ -0,0 +1,91 @@
+# tests/test_conditional.py
+
+import gzip
+import re
+import time
+import pytest
+from app import db
+from benchmarks.datagen import generate
+
+CSRF_TIME_LIMIT = 3600
+# the start of an ETag window
+EPOCH = 1_800_000_000 - 1_800_000_000 % CSRF_TIME_LIMIT
+
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(EPOCH + 5)
+    monkeypatch.setattr(time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def client(make_app):
+    app = make_app(WTF_CSRF_TIME_LIMIT=CSRF_TIME_LIMIT)
+    with app.app_context():
+        db.create_all()
+        generate(20)
+        db.session.remove()
+    return app.test_client()
+
+
+def csrf_token(response) -> str:
+    body = response.get_data()
+    if response.headers.get('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    return re.search(rb'name="csrf_token" type="hidden" value="([^"]+)"', body).group(1).decode()
+
+
+def new_book(token: str, title: str) -> dict:
+    return {'csrf_token': token, 'title': title, 'author_name': 'Jan', 'author_lastname': 'Testowy',
+            'genre': 'Powieść', 'publisher': 'Testowe', 'rating': '5', 'description': ''}
+
+
+def test_catalog_answers_304_until_it_changes(client, clock):
+    first = client.get('/library/')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert client.get('/library/', headers={'If-None-Match': etag}).status_code == 304
+    assert client.post('/library/', data=new_book(csrf_token(first), 'Nowa Książka')).status_code == 302
+    assert client.get('/library/', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_gzipped_page_has_a_weak_etag_that_revalidates(client, clock):
+    first = client.get('/library/', headers={'Accept-Encoding': 'gzip'})
+    assert first.headers['Content-Encoding'] == 'gzip'
+    assert first.get_etag()[1] is True
+    for encoding in ('gzip', 'identity'):
+        again = client.get('/library/', headers={'Accept-Encoding': encoding, 'If-None-Match': first.headers['ETag']})
+        assert again.status_code == 304
+        assert again.get_etag() == (first.get_etag()[0], encoding == 'gzip')
+
+
+def test_kept_page_has_a_live_token_for_as_long_as_it_revalidates(client, clock):
+    first = client.get('/library/', headers={'Accept-Encoding': 'gzip'})
+    token = csrf_token(first)
+    # a browser keeps showing the first page while the server answers 304
+    while client.get('/library/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['ETag']}) \
+            .status_code == 304:
+        clock.now += 60
+    clock.now -= 60
+    # a fresh page is rendered again, not the first one served from the compressed cache
+    assert csrf_token(client.get('/library/', headers={'Accept-Encoding': 'gzip'})) != token
+    # and the token of the kept page is still good when the form is sent ten minutes later
+    clock.now += 600
+    assert client.post('/library/', data=new_book(token, 'Późna Książka')).status_code == 302
+
+
+def test_expired_form_is_rendered_again(client, clock):
+    token = csrf_token(client.get('/library/'))
+    clock.now += CSRF_TIME_LIMIT + 60
+    response = client.post('/library/', data=new_book(token, 'Spóźniona Książka'))
+    assert response.status_code == 200
+    assert 'formularz wygasł' in response.get_data(as_text=True)
@@ -0,0 +1,49 @@
+# tests/test_sqlite_profile.py
+
+import pytest
+from sqlalchemy.pool import QueuePool
+from app import db
+from app.sqlite import profile_pragmas
+
+PRAGMAS = ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'temp_store')
+BUSY_TIMEOUT = 1234
+MMAP_SIZE = 8 * 1024 * 1024
+
+
+def pragmas(app):
+    """reads the pragmas of a connection checked out of the pool twice, so the second one is a pooled one"""
+    with app.app_context():
+        assert isinstance(db.engine.pool, QueuePool)
+        for _ in range(2):
+            with db.engine.connect() as connection:
+                values = {name: connection.execute(f"PRAGMA {name}").scalar() for name in PRAGMAS}
+    return values
+
+
+def test_performance_profile_sets_the_pragmas(make_app):
+    app = make_app(SQLITE_PROFILE='performance', SQLITE_BUSY_TIMEOUT=BUSY_TIMEOUT, SQLITE_MMAP_SIZE=MMAP_SIZE)
+    assert pragmas(app) == {
+        'journal_mode': 'wal',
+        'synchronous': 1,
+        'busy_timeout': BUSY_TIMEOUT,
+        'mmap_size': MMAP_SIZE,
+        'temp_store': 2
+    }
+
+
+def test_default_profile_leaves_the_pragmas_alone(make_app):
+    app = make_app(SQLITE_PROFILE='default', SQLITE_BUSY_TIMEOUT=BUSY_TIMEOUT, SQLITE_MMAP_SIZE=MMAP_SIZE)
+    values = pragmas(app)
+    assert values['journal_mode'] == 'delete'
+    assert values['synchronous'] == 2
+    assert values['busy_timeout'] != BUSY_TIMEOUT
+    assert values['mmap_size'] == 0
+    assert values['temp_store'] == 0
+
+
+def test_unknown_profile_raises(make_app):
+    with pytest.raises(ValueError):
+        profile_pragmas({'SQLITE_PROFILE': 'turbo'})
+    app = make_app(SQLITE_PROFILE='turbo')
+    with app.app_context(), pytest.raises(ValueError):
+        db.engine.connect()
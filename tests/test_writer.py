@@ -0,0 +1,169 @@
+# tests/test_writer.py
+
+import threading
+import time
+import pytest
+from app import db
+from app.models import Book, Genre, Loan
+from app.writer import WriteQueueFull, WriteTimeout, writer
+from benchmarks.datagen import generate
+
+WAIT = 5
+
+
+class Gate:
+    """a write that holds the writer thread until it is opened, so the writes behind it queue up"""
+
+    def __init__(self):
+        self.entered = threading.Event()
+        self.opened = threading.Event()
+
+    def __call__(self):
+        self.entered.set()
+        self.opened.wait(WAIT)
+
+    def close(self):
+        """queues the gate and waits until the writer is stuck in it"""
+        submit(self)
+        assert self.entered.wait(WAIT)
+
+    def open(self):
+        self.opened.set()
+
+
+def submit(function, *args):
+    """hands the call to the writer from a thread of its own and returns the thread and its outcome"""
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = writer.submit(function, *args)
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+def queued(count: int) -> None:
+    deadline = time.monotonic() + WAIT
+    while writer.stats()['queued'] < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def add_genre(name: str) -> None:
+    Genre().add_genre(name)
+
+
+def add_genre_and_fail(name: str) -> None:
+    Genre().add_genre(name)
+    raise ValueError(name)
+
+
+def genres() -> set:
+    db.session.remove()
+    return {genre for genre, in db.session.query(Genre.genre)}
+
+
+@pytest.fixture
+def make_writer_app(make_app):
+    """builds an app writing through the write queue on a small catalog"""
+    def make(**settings):
+        app = make_app(WRITE_QUEUE=True, WTF_CSRF_ENABLED=False, **settings)
+        with app.app_context():
+            db.create_all()
+            generate(10)
+            db.session.remove()
+        return app
+    return make
+
+
+@pytest.fixture
+def gate():
+    gate = Gate()
+    yield gate
+    gate.open()
+
+
+def book_on_shelf() -> int:
+    return db.session.query(Book.id).filter(~Book.id.in_(
+        db.session.query(Loan.book_id).filter(Loan.returned_at.is_(None), Loan.book_id.isnot(None))
+    )).first()[0]
+
+
+def test_queued_writes_share_one_commit(make_writer_app, gate):
+    app = make_writer_app()
+    with app.app_context():
+        gate.close()
+        calls = [submit(add_genre, f'Gatunek {number}') for number in range(5)]
+        queued(5)
+        groups = writer.stats()['groups']
+        gate.open()
+        for thread, outcome in calls:
+            thread.join(WAIT)
+            assert 'error' not in outcome
+        # the gate's group and one group for the five writes behind it
+        assert writer.stats()['groups'] == groups + 2
+        assert writer.stats()['largest_group'] >= 5
+        assert {f'Gatunek {number}' for number in range(5)} <= genres()
+
+
+def test_failing_write_is_rolled_back_alone(make_writer_app, gate):
+    app = make_writer_app()
+    with app.app_context():
+        gate.close()
+        calls = [submit(add_genre, 'Przed'), submit(add_genre_and_fail, 'Błędny'), submit(add_genre, 'Po')]
+        queued(3)
+        gate.open()
+        for thread, _ in calls:
+            thread.join(WAIT)
+        assert [type(outcome.get('error')) for _, outcome in calls] == [type(None), ValueError, type(None)]
+        names = genres()
+        assert {'Przed', 'Po'} <= names
+        assert 'Błędny' not in names
+
+
+# the writer thread is killed on purpose
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')
+def test_dead_writer_is_replaced(make_writer_app):
+    app = make_writer_app(WRITE_QUEUE_TIMEOUT=0.2, WRITE_GROUP_TIMEOUT=0.2)
+
+    def die():
+        raise SystemExit
+
+    with app.app_context():
+        with pytest.raises(WriteTimeout):
+            writer.submit(die)
+        writer.submit(add_genre, 'Po Restarcie')
+        assert 'Po Restarcie' in genres()
+
+
+def test_full_queue_answers_503_with_retry_after(make_writer_app, gate):
+    app = make_writer_app(WRITE_QUEUE_SIZE=1, WRITE_QUEUE_TIMEOUT=0.2)
+    with app.app_context():
+        book_id = book_on_shelf()
+        gate.close()
+        submit(add_genre, 'Czekający')
+        queued(1)
+        response = app.test_client().post(f'/delete/{book_id}/')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+        with pytest.raises(WriteQueueFull):
+            writer.submit(add_genre, 'Nadmiarowy')
+
+
+def test_timed_out_write_answers_504_and_may_still_commit(make_writer_app, gate):
+    app = make_writer_app(WRITE_QUEUE_TIMEOUT=0.2, WRITE_GROUP_TIMEOUT=0.2)
+    with app.app_context():
+        book_id = book_on_shelf()
+        gate.close()
+        response = app.test_client().post(f'/delete/{book_id}/')
+        assert response.status_code == 504
+        assert 'Retry-After' not in response.headers
+        # the write stayed queued and goes through once the writer gets to it
+        gate.open()
+        writer.submit(add_genre, 'Po Zapisie')
+        db.session.remove()
+        assert Book.query.get(book_id) is None